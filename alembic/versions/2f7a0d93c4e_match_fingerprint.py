@@ -0,0 +1,13 @@
+revision = '2f7a0d93c4e'
+down_revision = '26522536691'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('match', sa.Column('fingerprint', sa.Text(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('match', 'fingerprint')
@@ -0,0 +1,17 @@
+revision = '3a9c4e7f1b6'
+down_revision = '5d2f8b0e3a7'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('question',
+        sa.Column('answered', sa.Boolean(), nullable=True))
+    op.add_column('question',
+        sa.Column('index_digest', sa.Text(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('question', 'index_digest')
+    op.drop_column('question', 'answered')
@@ -0,0 +1,24 @@
+revision = '4b1e6c2d8a3'
+down_revision = '2f7a0d93c4e'
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+def upgrade():
+    op.create_table('county_mention',
+        sa.Column('document_id', postgresql.UUID(), nullable=False),
+        sa.Column('county_id', postgresql.UUID(), nullable=False),
+        sa.Column('parent', sa.Text(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['county_id'], ['county.id']),
+        sa.PrimaryKeyConstraint('document_id', 'county_id'),
+    )
+    op.create_index('ix_county_mention_county_id',
+                    'county_mention', ['county_id'])
+
+
+def downgrade():
+    op.drop_index('ix_county_mention_county_id')
+    op.drop_table('county_mention')
@@ -0,0 +1,23 @@
+revision = '5d2f8b0e3a7'
+down_revision = '4b1e6c2d8a3'
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+def upgrade():
+    op.create_table('scraper_checkpoint',
+        sa.Column('id', postgresql.UUID(), nullable=False),
+        sa.Column('command', sa.Text(), nullable=False),
+        sa.Column('key', sa.Text(), nullable=False),
+        sa.Column('data', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_scraper_checkpoint_command',
+                    'scraper_checkpoint', ['command'])
+
+
+def downgrade():
+    op.drop_index('ix_scraper_checkpoint_command')
+    op.drop_table('scraper_checkpoint')
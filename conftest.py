@@ -1,5 +1,10 @@
+from datetime import timedelta
 import pytest
+import flask
 from mock import Mock
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
 
 
 class MockSession:
@@ -17,3 +22,59 @@ class MockSession:
 @pytest.fixture
 def session():
     return MockSession()
+
+
+class StubAdapter(BaseAdapter):
+    """ Serves `pages`, a dict of `url: (headers, content)`, and answers
+    conditional requests with `304 Not Modified` if the `ETag` matches """
+
+    def __init__(self):
+        super().__init__()
+        self.pages = {}
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        (headers, content) = self.pages[request.url]
+        response = requests.Response()
+        response.status_code = 200
+        etag = headers.get('ETag')
+        if etag and request.headers.get('If-None-Match') == etag:
+            response.status_code = 304
+            content = b''
+        response.url = request.url
+        response.request = request
+        response.headers = CaseInsensitiveDict(headers)
+        response._content = content
+        response.elapsed = timedelta(seconds=.1)
+        return response
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def stub_adapter():
+    return StubAdapter()
+
+
+@pytest.fixture
+def models_app(request):
+    """ The mptracker models on an in-memory SQLite database """
+    from sqlalchemy.ext.compiler import compiles
+    from sqlalchemy.dialects.postgresql import UUID, DATERANGE
+    from mptracker import models
+
+    @compiles(UUID, 'sqlite')
+    @compiles(DATERANGE, 'sqlite')
+    def compile_as_text(type_, compiler, **kw):
+        return 'TEXT'
+
+    app = flask.Flask('__main__')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    models.db.init_app(app)
+    ctx = app.app_context()
+    ctx.push()
+    models.db.create_all()
+    request.addfinalizer(ctx.pop)
+    return app
@@ -48,6 +48,9 @@ def create_manager(app):
     from mptracker.proposals import proposals_manager
     from mptracker.votes import votes_manager
     from mptracker.policy import policy_manager
+    from mptracker.benchmark import benchmark_manager
+    from mptracker.mentions import mentions_manager
+    from mptracker.transcripts import transcripts_manager
 
     manager = Manager(app)
 
@@ -58,6 +61,9 @@ def create_manager(app):
     manager.add_command('proposals', proposals_manager)
     manager.add_command('votes', votes_manager)
     manager.add_command('policy', policy_manager)
+    manager.add_command('benchmark', benchmark_manager)
+    manager.add_command('mentions', mentions_manager)
+    manager.add_command('transcripts', transcripts_manager)
 
     @manager.command
     def worker():
@@ -0,0 +1,510 @@
+""" Benchmarks for the hot paths of the text analysis and scraper code """
+
+import time
+import random
+import logging
+import subprocess
+from datetime import datetime
+import flask
+from flask.ext.script import Manager
+from path import path
+from mptracker.nlp import (NameMatcher, CountyIndex, other_phrases, tokenize,
+                           normalize)
+from mptracker.placenames import get_county_data, list_county_codes
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+benchmark_manager = Manager()
+
+WORDS_PER_PAGE = 400
+
+FILLER_WORDS = [
+    'domnule', 'ministru', 'vă', 'rog', 'să', 'precizați', 'care', 'sunt',
+    'măsurile', 'pe', 'care', 'le', 'veți', 'lua', 'pentru', 'locuitorii',
+    'din', 'comuna', 'orașul', 'județul', 'drumul', 'județean', 'școala',
+    'spitalul', 'primăria', 'în', 'anul', '2013', 'fonduri', 'europene',
+    'memoriu', 'audiență', 'cabinetul', 'parlamentar', 'solicit', 'răspuns',
+    'scris', 'lege', 'privind', 'modificarea', 'art.', 'alin.', '(2)',
+    'ş.a.m.d.', '-', 'I1', 'rn', 'ţ', 'Obiectul', 'întrebării',
+]
+
+
+def synthetic_text(county_data, n_words, seed=0):
+    """ Text shaped like OCR output of a question: mostly filler words,
+    some place names and, once per page, the MP's signature. """
+    rnd = random.Random(seed)
+    place_names = county_data['place_names']
+    words = []
+    for n in range(n_words):
+        if n % WORDS_PER_PAGE == 0:
+            words += ['Deputat', 'PSD', county_data['name'] + ',']
+        elif rnd.random() < .05:
+            words.append(rnd.choice(place_names))
+        else:
+            words.append(rnd.choice(FILLER_WORDS))
+    return ' '.join(words)
+
+
+def synthetic_corpus(county_data, n_documents=10, seed=0):
+    """ Documents of 1 to 8 pages, the usual size of questions """
+    rnd = random.Random(seed)
+    return [
+        synthetic_text(county_data, WORDS_PER_PAGE * rnd.randint(1, 8),
+                       seed=seed + n)
+        for n in range(n_documents)
+    ]
+
+
+def load_corpus(corpus_dir):
+    """ Recorded texts, e.g. OCR output saved as one `.txt` file per
+    document """
+    return [f.text(encoding='utf-8')
+            for f in sorted(path(corpus_dir).files('*.txt'))]
+
+
+def get_revision():
+    try:
+        output = subprocess.check_output(
+            ['git', 'describe', '--always', '--dirty'],
+            cwd=flask.current_app.root_path,
+            stderr=subprocess.DEVNULL,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode('ascii').strip()
+
+
+def best_time(func, repeat):
+    times = []
+    for n in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+@benchmark_manager.command
+def match_scaling(county_code='12', pages='1,2,4,8,16,32', repeat='3'):
+    """ Time NameMatcher.match on texts of increasing length """
+    county_data = get_county_data(int(county_code))
+    matcher = NameMatcher(county_data['place_names'], other_phrases)
+    mp_info = {'name': "Popescu Ion", 'county_name': county_data['name']}
+
+    rates = []
+    for n_pages in [int(p) for p in pages.split(',')]:
+        text = synthetic_text(county_data, WORDS_PER_PAGE * n_pages)
+        n_tokens = len(list(tokenize(text)))
+        seconds = best_time(lambda: matcher.match(text, mp_info), int(repeat))
+        rates.append(n_tokens / seconds)
+        print("%4d pages %8d tokens %8.3f s %10.0f tokens/s"
+              % (n_pages, n_tokens, seconds, rates[-1]))
+
+    print("throughput at %s pages is %.0f%% of throughput at %s pages"
+          % (pages.split(',')[-1], 100 * rates[-1] / rates[0],
+             pages.split(',')[0]))
+
+
+def legacy_parse_page(content, url):
+    """ Parse a page the way `Scraper` did before `parse_page`: transcode it
+    to UTF-16 for the parser's autodetection and let pyquery make all links
+    absolute """
+    from pyquery import PyQuery as pq
+    text = content.decode('iso-8859-2').encode('utf-16')
+    page = pq(text, parser='html')
+    page.make_links_absolute(url)
+    return page
+
+
+@benchmark_manager.command
+def parse_pages(pages_dir=None, repeat='10'):
+    """ Time parsing each saved cdep.ro page, the old way and with
+    `Scraper.parse_page` """
+    from mptracker.scraper.common import Scraper
+    if pages_dir is None:
+        pages_dir = (path(flask.current_app.root_path).parent /
+                     'testsuite' / 'pages')
+    base_url = 'http://www.cdep.ro/pls/parlam/'
+    scraper = Scraper()
+
+    print("%-30s %8s %9s %9s %7s" % ("page", "size", "before", "after", ""))
+    total_before = total_after = 0
+    # the `.html` files are UTF-8 table fragments, not saved pages
+    for page_path in sorted(path(pages_dir).files()):
+        if page_path.ext == '.html':
+            continue
+        content = page_path.bytes()
+        before = best_time(lambda: legacy_parse_page(content, base_url),
+                           int(repeat))
+        after = best_time(lambda: scraper.parse_page(content, base_url),
+                          int(repeat))
+        total_before += before
+        total_after += after
+        print("%-30s %7dK %7.2fms %7.2fms %6.1fx" % (
+            page_path.name, len(content) // 1024,
+            before * 1000, after * 1000, before / after))
+
+    print("%-30s %8s %7.2fms %7.2fms %6.1fx" % (
+        "total", "", total_before * 1000, total_after * 1000,
+        total_before / total_after))
+
+
+ANCHOR_TEXTS = [
+    "PL înregistrat la",
+    "Nr. înregistrare",
+    "Derularea procedurii legislative",
+    "Sunteţi în secţiunea",
+    "Subiect vot:",
+    "Nr. Crt.",
+    "înregistrări",
+]
+
+
+def legacy_find_anchor_table(page, text):
+    found = page(':contains("%s")' % text)
+    return found.parents('table')[-1] if found else None
+
+
+@benchmark_manager.command
+def anchor_lookup(pages_dir=None, repeat='10'):
+    """ Time locating the tables that scrapers find by their anchor text,
+    with pyquery's `:contains()` selector and with `find_anchors` """
+    from mptracker.scraper.common import (Scraper, find_anchors,
+                                          enclosing_table)
+    if pages_dir is None:
+        pages_dir = (path(flask.current_app.root_path).parent /
+                     'testsuite' / 'pages')
+    base_url = 'http://www.cdep.ro/pls/parlam/'
+    scraper = Scraper()
+
+    def lookup_all(page):
+        for text in ANCHOR_TEXTS:
+            anchors = find_anchors(page, text)
+            if anchors:
+                enclosing_table(anchors[-1])
+
+    print("%-30s %9s %9s %7s" % ("page", "before", "after", ""))
+    total_before = total_after = 0
+    for page_path in sorted(path(pages_dir).files()):
+        if page_path.ext == '.html':
+            continue
+        page = scraper.parse_page(page_path.bytes(), base_url)
+        before = best_time(
+            lambda: [legacy_find_anchor_table(page, text)
+                     for text in ANCHOR_TEXTS],
+            int(repeat))
+        after = best_time(lambda: lookup_all(page), int(repeat))
+        total_before += before
+        total_after += after
+        print("%-30s %7.2fms %7.2fms %6.1fx" % (
+            page_path.name, before * 1000, after * 1000, before / after))
+
+    print("%-30s %7.2fms %7.2fms %6.1fx" % (
+        "total", total_before * 1000, total_after * 1000,
+        total_before / total_after))
+
+
+def get_scraper_command(name):
+    import inspect
+    from mptracker.scraper import scraper_manager
+    # not `getattr(scraper, name)`: scraper submodules, once imported,
+    # shadow the commands of the same name
+    command = scraper_manager._commands.get(name)
+    func = getattr(command, 'run', None)
+    if func is None or 'replay' not in inspect.signature(func).parameters:
+        raise RuntimeError("%r is not a scraper command that can replay "
+                           "pages" % name)
+    return func
+
+
+def parse_command_options(options):
+    """ `"days=30,no_commit"` -> `{'days': '30', 'no_commit': True}` """
+    rv = {}
+    for item in filter(None, options.split(',')):
+        (key, eq, value) = item.partition('=')
+        rv[key.strip()] = value.strip() if eq else True
+    return rv
+
+
+@benchmark_manager.command
+def record_scraper(bundle, name, options=''):
+    """ Run scraper command `name` with `options`, saving every page it
+    fetches to a new page archive in the `bundle` folder, to be replayed
+    by `replay_scraper` """
+    bundle = path(bundle).abspath()
+    if bundle.exists():
+        raise RuntimeError("%s already exists" % bundle)
+    func = get_scraper_command(name)
+    kwargs = parse_command_options(options)
+
+    app = flask.current_app
+    app.config['MPTRACKER_PAGE_ARCHIVE'] = bundle
+    func(archive=True, **kwargs)
+
+    with open(bundle / 'bundle.json', 'w', encoding='utf-8') as f:
+        flask.json.dump({
+            'command': name,
+            'options': kwargs,
+            'revision': get_revision(),
+            'time': datetime.utcnow().isoformat(),
+        }, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def reset_scratch_database(scratch_uri, template=None):
+    """ (Re)create the scratch database, either empty or as a copy of
+    `template`, and point the app's session at it """
+    import sqlalchemy
+    from sqlalchemy.engine.url import make_url
+    from mptracker import models
+    app = flask.current_app
+
+    models.db.session.remove()
+    models.db.get_engine(app).dispose()
+
+    scratch_url = make_url(scratch_uri)
+    maintenance_url = make_url(scratch_uri)
+    maintenance_url.database = 'postgres'
+    engine = sqlalchemy.create_engine(maintenance_url,
+                                      isolation_level='AUTOCOMMIT')
+    with engine.connect() as conn:
+        conn.execute('DROP DATABASE IF EXISTS "%s"' % scratch_url.database)
+        if template:
+            conn.execute('CREATE DATABASE "%s" TEMPLATE "%s"'
+                         % (scratch_url.database, template))
+        else:
+            conn.execute('CREATE DATABASE "%s"' % scratch_url.database)
+    engine.dispose()
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = scratch_uri
+    if not template:
+        models.db.session.execute('CREATE EXTENSION "uuid-ossp"')
+        models.db.session.execute('CREATE EXTENSION "unaccent"')
+        models.db.session.commit()
+        models.db.create_all()
+
+
+class RowCounter:
+    """ Counts the rows written by INSERT, UPDATE and DELETE statements """
+
+    def __init__(self):
+        self.rows = 0
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters,
+                             context, executemany):
+        if statement.lstrip()[:6].upper() in ['INSERT', 'UPDATE', 'DELETE']:
+            self.rows += max(cursor.rowcount, 0)
+
+    def __enter__(self):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        event.listen(Engine, 'after_cursor_execute',
+                     self.after_cursor_execute)
+        return self
+
+    def __exit__(self, *exc_info):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        event.remove(Engine, 'after_cursor_execute',
+                     self.after_cursor_execute)
+
+
+@benchmark_manager.command
+def replay_scraper(bundle, repeat='3', database=None, template=None,
+                   output=None):
+    """ Run the scraper command recorded in `bundle` against its pages,
+    ingesting into a scratch database, which is recreated before each run
+    from `template` or, by default, with an empty schema """
+    from sqlalchemy.engine.url import make_url
+    from mptracker import scraper
+    from mptracker.scraper.archive import PageArchive
+    bundle = path(bundle).abspath()
+    with open(bundle / 'bundle.json', encoding='utf-8') as f:
+        recorded = flask.json.load(f)
+    func = get_scraper_command(recorded['command'])
+    n_pages = len(PageArchive(bundle))
+
+    app = flask.current_app
+    main_uri = app.config['SQLALCHEMY_DATABASE_URI']
+    if database is None:
+        scratch_url = make_url(main_uri)
+        scratch_url.database += '_benchmark'
+        database = str(scratch_url)
+    if make_url(database).database == make_url(main_uri).database:
+        raise RuntimeError("refusing to use the main database as scratch")
+    app.config['MPTRACKER_PAGE_ARCHIVE'] = bundle
+
+    runs = []
+    try:
+        for n in range(int(repeat)):
+            reset_scratch_database(database, template)
+            scraper._run_documents = None
+            with RowCounter() as counter:
+                t0 = time.perf_counter()
+                func(replay=True, **recorded['options'])
+                seconds = time.perf_counter() - t0
+            runs.append({'seconds': seconds, 'rows': counter.rows})
+            print("run %d: %8.2fs %6d pages %8.1f pages/s "
+                  "%7d rows %9.1f rows/s"
+                  % (n + 1, seconds, n_pages, n_pages / seconds,
+                     counter.rows, counter.rows / seconds))
+
+    finally:
+        from mptracker import models
+        models.db.session.remove()
+        app.config['SQLALCHEMY_DATABASE_URI'] = main_uri
+
+    best = min(runs, key=lambda run: run['seconds'])
+    print("%s: best of %d %.2fs, %.1f pages/s, %.1f rows/s" % (
+        recorded['command'], len(runs), best['seconds'],
+        n_pages / best['seconds'], best['rows'] / best['seconds']))
+
+    if output:
+        results = {
+            'revision': get_revision(),
+            'time': datetime.utcnow().isoformat(),
+            'bundle': bundle,
+            'command': recorded['command'],
+            'options': recorded['options'],
+            'pages': n_pages,
+            'runs': runs,
+            'seconds': best['seconds'],
+            'pages_per_second': n_pages / best['seconds'],
+            'rows_per_second': best['rows'] / best['seconds'],
+        }
+        with open(output, 'w', encoding='utf-8') as f:
+            flask.json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+
+def benchmark_county(county_data, corpus, repeat, max_distance=0):
+    place_names = county_data['place_names']
+    token_lists = [list(tokenize(text)) for text in corpus]
+    n_tokens = sum(len(tokens) for tokens in token_lists)
+    mp_info = {'name': "Popescu Ion", 'county_name': county_data['name']}
+
+    tokenize_seconds = best_time(
+        lambda: [list(tokenize(text)) for text in corpus], repeat)
+    normalize_seconds = best_time(
+        lambda: [normalize(t.text) for tokens in token_lists
+                 for t in tokens], repeat)
+    build_seconds = best_time(
+        lambda: NameMatcher(place_names, other_phrases, max_distance), repeat)
+
+    matcher = NameMatcher(place_names, other_phrases, max_distance)
+    latency = sorted(
+        best_time(lambda: matcher.match(text, mp_info), repeat)
+        for text in corpus
+    )
+    match_seconds = sum(latency)
+
+    return {
+        'name': county_data['name'],
+        'vocabulary_size': len(place_names),
+        'documents': len(corpus),
+        'tokens': n_tokens,
+        'tokenize_tokens_per_second': n_tokens / tokenize_seconds,
+        'normalize_tokens_per_second': n_tokens / normalize_seconds,
+        'build_seconds': build_seconds,
+        'match_tokens_per_second': n_tokens / match_seconds,
+        'match_latency_median': latency[len(latency) // 2],
+        'match_latency_max': latency[-1],
+    }
+
+
+@benchmark_manager.command
+def run(counties=None, corpus=None, documents='10', repeat='3',
+        max_distance='0', output=None):
+    """ Benchmark tokenizing, normalizing and matching for each county and
+    optionally save the results as JSON, to compare them across commits """
+    if counties:
+        county_codes = [int(c) for c in counties.split(',')]
+    else:
+        county_codes = list_county_codes()
+    county_data_list = [get_county_data(code) for code in county_codes]
+    county_data_list.sort(key=lambda c: len(c['place_names']))
+    recorded_corpus = load_corpus(corpus) if corpus else None
+
+    print("%-20s %6s %9s %9s %9s %7s %9s %8s %8s" % (
+        "county", "names", "tokens", "tokenize", "normalize", "build",
+        "match", "median", "max"))
+    county_results = {}
+    for county_data in county_data_list:
+        if recorded_corpus is None:
+            texts = synthetic_corpus(county_data, int(documents))
+        else:
+            texts = recorded_corpus
+        rv = benchmark_county(county_data, texts, int(repeat),
+                              int(max_distance))
+        county_results['%02d' % county_data['code']] = rv
+        print("%-20s %6d %9d %9.0f %9.0f %6.3fs %9.0f %7.1fms %7.1fms" % (
+            rv['name'], rv['vocabulary_size'], rv['tokens'],
+            rv['tokenize_tokens_per_second'],
+            rv['normalize_tokens_per_second'],
+            rv['build_seconds'],
+            rv['match_tokens_per_second'],
+            rv['match_latency_median'] * 1000,
+            rv['match_latency_max'] * 1000))
+
+    index_texts = recorded_corpus or synthetic_corpus(county_data_list[-1],
+                                                      int(documents))
+    index = CountyIndex(county_data_list)
+    n_tokens = sum(len(list(tokenize(text))) for text in index_texts)
+    index_seconds = best_time(
+        lambda: [index.count_mentions(text) for text in index_texts],
+        int(repeat))
+    print("county index: %.0f tokens/s over %d counties"
+          % (n_tokens / index_seconds, len(county_data_list)))
+
+    if output:
+        results = {
+            'revision': get_revision(),
+            'time': datetime.utcnow().isoformat(),
+            'corpus': corpus or 'synthetic',
+            'max_distance': int(max_distance),
+            'counties': county_results,
+            'county_index_tokens_per_second': n_tokens / index_seconds,
+        }
+        with open(output, 'w', encoding='utf-8') as f:
+            flask.json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+
+COMPARED_METRICS = [
+    'tokenize_tokens_per_second',
+    'normalize_tokens_per_second',
+    'match_tokens_per_second',
+]
+
+
+@benchmark_manager.command
+def compare(baseline, current):
+    """ Compare two result files saved by `run --output` """
+    with open(baseline, encoding='utf-8') as f:
+        old = flask.json.load(f)
+    with open(current, encoding='utf-8') as f:
+        new = flask.json.load(f)
+    print("%s -> %s" % (old['revision'], new['revision']))
+
+    ratios = {metric: [] for metric in COMPARED_METRICS}
+    for code in sorted(set(old['counties']) & set(new['counties'])):
+        old_county = old['counties'][code]
+        new_county = new['counties'][code]
+        row = []
+        for metric in COMPARED_METRICS:
+            ratio = new_county[metric] / old_county[metric]
+            ratios[metric].append(ratio)
+            row.append("%6.2fx" % ratio)
+        print("%-20s %s" % (new_county['name'], ' '.join(row)))
+
+    for metric in COMPARED_METRICS:
+        if ratios[metric]:
+            print("%-30s %6.2fx (geometric mean)"
+                  % (metric, geometric_mean(ratios[metric])))
+
+
+def geometric_mean(values):
+    product = 1.0
+    for value in values:
+        product *= value
+    return product ** (1.0 / len(values))
@@ -18,6 +18,13 @@ from path import path
 
 MAX_OCR_PAGES = 3
 
+# start and end (exclusive) of parliamentary vacations
+PARLIAMENT_VACATIONS = [
+    (date(2012, 12, 24), date(2013, 1, 21)),
+    (date(2013, 7, 1), date(2013, 9, 2)),
+    (date(2013, 12, 30), date(2014, 2, 3)),
+]
+
 common = flask.Blueprint('common', __name__)
 
 
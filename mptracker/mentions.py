@@ -0,0 +1,96 @@
+import logging
+from itertools import islice
+from flask.ext.script import Manager
+from flask.ext.rq import job
+from mptracker import models
+from mptracker.nlp import get_county_index, count_mentions_in_pool
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+mentions_manager = Manager()
+
+DOCUMENT_MODELS = {
+    'question': models.Question,
+    'proposal': models.Proposal,
+}
+
+
+def get_county_ids():
+    return {
+        geonames_code: county_id
+        for county_id, geonames_code in
+        models.db.session.query(models.County.id, models.County.geonames_code)
+        if geonames_code is not None
+    }
+
+
+def save_mentions(parent, results, county_ids):
+    """ Replace the mentions of each `(document_id, counts)` result, where
+    `counts` maps county codes to the number of place names found. """
+    table = models.CountyMention.__table__
+    document_ids = [document_id for document_id, counts in results]
+    models.db.session.execute(
+        table.delete().where(table.c.document_id.in_(document_ids)))
+    rows = [
+        {
+            'document_id': document_id,
+            'county_id': county_ids[code],
+            'parent': parent,
+            'count': count,
+        }
+        for document_id, counts in results
+        for code, count in counts.items()
+        if code in county_ids
+    ]
+    if rows:
+        models.db.session.execute(table.insert(), rows)
+
+
+@job
+def index_document(parent, document_id):
+    document = DOCUMENT_MODELS[parent].query.get(document_id)
+    text = document.title + ' ' + document.text
+    counts = get_county_index().count_mentions(text)
+    save_mentions(parent, [(document_id, counts)], get_county_ids())
+    models.db.session.commit()
+
+
+@mentions_manager.command
+def index_all(parent=None, number=None, processes=None):
+    """ Scan the text of every question and proposal once and store how
+    many place names of each county it mentions """
+    county_ids = get_county_ids()
+    parent_list = [parent] if parent else sorted(DOCUMENT_MODELS)
+
+    for parent in parent_list:
+        document_model = DOCUMENT_MODELS[parent]
+        text_query = (
+            models.db.session.query(
+                document_model.id,
+                document_model.title,
+                models.OcrText.text,
+            )
+            .join(models.OcrText, models.OcrText.id == document_model.id)
+            .filter(models.OcrText.text != None)
+        )
+
+        connection = models.db.engine.connect()
+        rows = (connection.execution_options(stream_results=True)
+                          .execute(text_query.statement))
+        documents = ((document_id, title + ' ' + text)
+                     for document_id, title, text in rows)
+        if number:
+            documents = islice(documents, int(number))
+
+        n_done = 0
+        try:
+            batches = count_mentions_in_pool(documents,
+                                             processes and int(processes))
+            for results in batches:
+                save_mentions(parent, results, county_ids)
+                models.db.session.commit()
+                n_done += len(results)
+                logger.info("indexed %d %ss", n_done, parent)
+        finally:
+            connection.close()
@@ -222,6 +222,11 @@ class Transcript(db.Model):
     mandate = db.relationship('Mandate',
         backref=db.backref('transcripts', lazy='dynamic'))
 
+    # only used in joins; don't load it with every transcript
+    match_row = db.relationship('Match', lazy='select', uselist=False,
+                    primaryjoin='Transcript.id==foreign(Match.id)',
+                    cascade='all')
+
 
 class Question(db.Model):
     id = db.Column(UUID, primary_key=True, default=random_uuid)
@@ -233,6 +238,8 @@ class Question(db.Model):
     type = db.Column(db.Text)
     method = db.Column(db.Text)
     addressee = db.Column(db.Text)
+    answered = db.Column(db.Boolean)
+    index_digest = db.Column(db.Text)
 
     policy_domain_id = db.Column(UUID, db.ForeignKey('policy_domain.id'))
     policy_domain = db.relationship('PolicyDomain')
@@ -328,6 +335,7 @@ class Match(db.Model):
     data = db.Column(db.Text)
     manual = db.Column(db.Boolean, nullable=False, default=False)
     score = db.Column(db.Float)
+    fingerprint = db.Column(db.Text)
 
     @classmethod
     def all_ids_for(cls, parent):
@@ -336,6 +344,40 @@ class Match(db.Model):
     def get_score_from_data(self):
         return len(flask.json.loads(self.data)['top_matches'])
 
+    @classmethod
+    def save_batch(cls, parent, results):
+        """ Store `(id, result, fingerprint)` tuples, loading existing
+        rows in a single query instead of one per row. """
+        results = {row_id: (result, fingerprint)
+                   for row_id, result, fingerprint in results}
+        existing = {row.id: row for row in
+                    cls.query.filter(cls.id.in_(list(results)))}
+        for row_id, (result, fingerprint) in results.items():
+            row = existing.get(row_id)
+            if row is None:
+                row = cls(id=row_id, parent=parent)
+                db.session.add(row)
+            row.data = flask.json.dumps(result)
+            row.fingerprint = fingerprint
+            if not row.manual:
+                row.score = row.get_score_from_data()
+
+
+class CountyMention(db.Model):
+    document_id = db.Column(UUID, primary_key=True)
+    county_id = db.Column(UUID, db.ForeignKey('county.id'), primary_key=True,
+                          index=True)
+    county = db.relationship('County')
+    parent = db.Column(db.Text, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+
+
+class ScraperCheckpoint(db.Model):
+    id = db.Column(UUID, primary_key=True, default=random_uuid)
+    command = db.Column(db.Text, nullable=False, index=True)
+    key = db.Column(db.Text, nullable=False)
+    data = db.Column(JsonString)
+
 
 class Meta(db.Model):
     __table_args__ = (
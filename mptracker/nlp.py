@@ -1,6 +1,19 @@
 import re
-from collections import namedtuple, defaultdict
-from mptracker.placenames import get_county_data, get_minority_names
+import json
+import pickle
+import hashlib
+import logging
+import multiprocessing
+from collections import namedtuple, deque, defaultdict
+from functools import lru_cache
+from itertools import islice, groupby
+import flask
+from path import path
+from mptracker.placenames import (get_county_data, get_minority_names,
+                                  list_county_codes)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
 
 Token = namedtuple('Token', ['text', 'start', 'end'])
 ANY_PUNCTUATION = r'[.,;!?\-()]*'
@@ -98,82 +111,590 @@ def join_tokens(tokens):
     return Token(text, tokens[0].start, tokens[-1].end)
 
 
-def prepare_vocabulary(name_list):
-    out = defaultdict(dict)
-    for name in name_list:
-        norm_name = normalize(name)
-        if norm_name in stop_words:
-            continue
-        name_words = [t.text for t in tokenize(norm_name)]
-        word_count = len(name_words)
-        out[word_count][norm_name] = name
-    return sorted(out.items())
+def hash_json(value):
+    data = json.dumps(value, sort_keys=True).encode('utf-8')
+    return hashlib.sha1(data).hexdigest()[:16]
 
 
-def match_names(text, name_list, phrase_list, mp_info={}):
-    MP_TITLE_LOOKBEHIND_TOKENS = 7
+def text_fingerprint(text):
+    # same value as postgres' md5(text), so it can be compared in queries
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
 
-    name_vocabulary = prepare_vocabulary(name_list + phrase_list)
-    phrase_vocabulary = prepare_vocabulary(phrase_list)
 
-    matches = []
-    tokens = list(tokenize(text))
-    for idx in range(len(tokens)):
-        token_matches = []
-        first = tokens[idx].text[0]
-        vocabulary = name_vocabulary if first.isupper() else phrase_vocabulary
-        for word_count, counted_name_list in vocabulary:
-            if idx + word_count > len(tokens):
-                continue
-            token_window = tokens[idx : idx + word_count]
-            token = join_tokens(token_window)
-
-            for stem in [False, True]:
-                norm_token = normalize(token.text, stem=stem)
-                if norm_token in counted_name_list:
-                    distance = 1.0
-                    token_matches.append({
-                        'distance': distance,
-                        'name': counted_name_list[norm_token],
-                        'token': token,
-                    })
-
-        if not token_matches:
+def vocabulary_fingerprint(name_list, phrase_list, max_distance=0):
+    inputs = [
+        MultiMatcher.VERSION,
+        name_list,
+        phrase_list,
+        sorted(stop_words),
+        signature_stop_words,
+        stem_suffixes,
+    ]
+    if max_distance:
+        inputs.append(max_distance)
+    return hash_json(inputs)
+
+
+def add_to_trie(trie, name_list, key):
+    for name in name_list:
+        norm_name = normalize(name)
+        if not norm_name or norm_name in stop_words:
             continue
+        node = trie
+        for word in norm_name.split(' '):
+            node = node.setdefault(word, {})
+        node.setdefault(None, {})[key] = name
+
+
+def iter_trie_words(trie):
+    for word, node in trie.items():
+        if word is not None:
+            yield word
+            yield from iter_trie_words(node)
+
+
+def edit_distance(a, b):
+    previous = list(range(len(b) + 1))
+    for i, ch_a in enumerate(a, 1):
+        current = [i]
+        for j, ch_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1,
+                               current[j - 1] + 1,
+                               previous[j - 1] + (ch_a != ch_b)))
+        previous = current
+    return previous[-1]
+
+
+def deletes(word, distance):
+    rv = edge = {word}
+    for n in range(distance):
+        edge = {w[:i] + w[i + 1:] for w in edge for i in range(len(w))}
+        rv = rv | edge
+    return rv
+
+
+class FuzzyIndex:
+    """ Deletion dictionary (like SymSpell) over vocabulary words: each word
+    is stored under every string obtained by deleting up to its allowed
+    number of characters, so the words close to a token are found by
+    looking up the deletions of the token, not by scanning the vocabulary.
+    """
+
+    def __init__(self, words, max_distance):
+        self.max_distance = max_distance
+        self.words = set(words)
+        self.index = defaultdict(set)
+        for word in self.words:
+            for variant in deletes(word, self.allowed_distance(word)):
+                self.index[variant].add(word)
+
+    def allowed_distance(self, word):
+        # short words are too easily confused with one another
+        return min(self.max_distance, (len(word) - 1) // 4)
+
+    def lookup(self, token):
+        """ Map vocabulary words close to `token` to their edit distance """
+        distance = self.allowed_distance(token)
+        candidates = set()
+        for variant in deletes(token, distance):
+            candidates.update(self.index.get(variant, ()))
+        rv = {}
+        for word in candidates:
+            word_distance = edit_distance(token, word)
+            if word_distance <= min(distance, self.allowed_distance(word)):
+                rv[word] = word_distance
+        return rv
+
+
+class MultiMatcher:
+    """ Several vocabularies of names and phrases, normalized once into a
+    single trie keyed by token. Each terminal node maps a vocabulary key to
+    the name it matched, so a text is tokenized and walked once no matter
+    how many vocabularies it's matched against.
+
+    With a nonzero `max_distance`, words misspelled by OCR also match, as
+    long as a name has at most `max_distance` edits in total. """
 
-        token_matches.sort(key=lambda m: len(m['name']))
-        top_match = token_matches[-1]
+    MP_TITLE_LOOKBEHIND_TOKENS = 7
 
-        if (normalize(top_match['name']) ==
-                normalize(mp_info.get('county_name') or '')):
-            mp_name_bits = [t.text for t in tokenize(mp_info.get('name', ''))]
+    # bump this when a change to the matching code alters its results
+    VERSION = 1
+
+    def __init__(self, vocabularies, phrase_list, max_distance=0):
+        self.name_trie = {}
+        self.phrase_trie = {}
+        self.fingerprints = {}
+        self.max_distance = max_distance
+        for key, name_list in vocabularies.items():
+            add_to_trie(self.name_trie, name_list + phrase_list, key)
+            add_to_trie(self.phrase_trie, phrase_list, key)
+            self.fingerprints[key] = vocabulary_fingerprint(
+                name_list, phrase_list, max_distance)
+        self.fuzzy_index = None
+        if max_distance:
+            self.fuzzy_index = FuzzyIndex(iter_trie_words(self.name_trie),
+                                          max_distance)
+
+    def find_top_matches(self, tokens, plain, stemmed, idx, keys=None):
+        """ Walk the trie from token `idx` along the normalized and the
+        stemmed token arrays. For each vocabulary key, return the longest
+        name found, the index of the token after it, and 0 edits. """
+        first = tokens[idx].text[0]
+        trie = self.name_trie if first.isupper() else self.phrase_trie
+        plain_node = stem_node = trie
+        top = {}
+        for end in range(idx, len(tokens)):
+            if plain_node is not None:
+                plain_node = plain_node.get(plain[end])
+            if stem_node is not None:
+                stem_node = stem_node.get(stemmed[end])
+            if plain_node is None and stem_node is None:
+                break
+            for node in [plain_node, stem_node]:
+                if node is None or None not in node:
+                    continue
+                names = node[None]
+                for key in (names if keys is None else keys):
+                    name = names.get(key)
+                    if name is None:
+                        continue
+                    if key not in top or len(name) >= len(top[key][0]):
+                        top[key] = (name, end + 1, 0)
+        return top
+
+    def get_alternatives(self, plain, stemmed):
+        """ For each token, the vocabulary words it may stand for, with
+        their edit distance. Tokens found in the vocabulary as they are, or
+        after stemming, are not looked up in the fuzzy index. """
+        lookups = {}
+        alternatives = []
+        for plain_word, stemmed_word in zip(plain, stemmed):
+            words = {plain_word: 0, stemmed_word: 0}
+            if not (plain_word in self.fuzzy_index.words or
+                    stemmed_word in self.fuzzy_index.words):
+                if plain_word not in lookups:
+                    lookups[plain_word] = self.fuzzy_index.lookup(plain_word)
+                words.update(lookups[plain_word])
+            alternatives.append(list(words.items()))
+        return alternatives
+
+    def find_fuzzy_top_matches(self, tokens, alternatives, idx, keys=None):
+        """ Like `find_top_matches`, but walk all the alternatives of each
+        token. Among names of the same length, the one with fewer edits
+        wins. """
+        first = tokens[idx].text[0]
+        trie = self.name_trie if first.isupper() else self.phrase_trie
+        states = [(trie, 0)]
+        top = {}
+        for end in range(idx, len(tokens)):
+            states = [
+                (node[word], edits + word_edits)
+                for node, edits in states
+                for word, word_edits in alternatives[end]
+                if word in node and edits + word_edits <= self.max_distance
+            ]
+            if not states:
+                break
+            for node, edits in states:
+                if None not in node:
+                    continue
+                names = node[None]
+                for key in (names if keys is None else keys):
+                    name = names.get(key)
+                    if name is None:
+                        continue
+                    if key in top:
+                        (top_name, top_end, top_edits) = top[key]
+                        if len(name) < len(top_name):
+                            continue
+                        if len(name) == len(top_name) and edits > top_edits:
+                            continue
+                    top[key] = (name, end + 1, edits)
+        return top
+
+    def prepare_text(self, text):
+        tokens = list(tokenize(text))
+        plain = [normalize(t.text) for t in tokens]
+        stemmed = [' '.join(simple_stem(w) for w in word.split())
+                   for word in plain]
+        return (tokens, plain, stemmed)
+
+    def match_targets(self, text, targets):
+        """ Match `text` for each `(target_id, key, mp_info)` target. A
+        target's county name is ignored when it looks like the signature of
+        that MP. Returns a list of matches for each target id. """
+        (tokens, plain, stemmed) = self.prepare_text(text)
+        keys = set(key for target_id, key, mp_info in targets)
+        if self.fuzzy_index is not None:
+            alternatives = self.get_alternatives(plain, stemmed)
+
+        signatures = []
+        for target_id, key, mp_info in targets:
+            county_name = normalize(mp_info.get('county_name') or '')
+            mp_name_bits = [t.text for t in
+                            tokenize(mp_info.get('name', ''))]
             signature_bits = set(normalize(word) for word in
                                  mp_name_bits + signature_stop_words)
+            signatures.append((target_id, key, county_name, signature_bits))
 
-            recent_tokens = tokens[:idx][- MP_TITLE_LOOKBEHIND_TOKENS:]
-            recent_text_bits = set(normalize(t.text) for t in recent_tokens)
+        matches = {target_id: [] for target_id, key, mp_info in targets}
+        recent_words = deque(maxlen=self.MP_TITLE_LOOKBEHIND_TOKENS)
 
-            if len(signature_bits & recent_text_bits) > 0:
-                continue
+        for idx in range(len(tokens)):
+            if self.fuzzy_index is None:
+                top = self.find_top_matches(tokens, plain, stemmed, idx, keys)
+            else:
+                top = self.find_fuzzy_top_matches(tokens, alternatives,
+                                                  idx, keys)
+            joined = {}
+            for target_id, key, county_name, signature_bits in signatures:
+                if key not in top:
+                    continue
+                (name, end, edits) = top[key]
+                norm_name = normalize(name)
+                if (norm_name == county_name and
+                        signature_bits.intersection(recent_words)):
+                    continue
+                if end not in joined:
+                    joined[end] = join_tokens(tokens[idx:end])
+                matches[target_id].append({
+                    'distance': 1.0 - edits / len(norm_name),
+                    'name': name,
+                    'token': joined[end],
+                })
+            recent_words.append(plain[idx])
 
-        matches.append(top_match)
+        return matches
 
-    return matches
 
+class NameMatcher(MultiMatcher):
+    """ Matcher for a single vocabulary of names and phrases """
+
+    def __init__(self, name_list, phrase_list, max_distance=0):
+        super().__init__({None: name_list}, phrase_list, max_distance)
+        self.fingerprint = self.fingerprints[None]
+
+    def match(self, text, mp_info={}):
+        return self.match_targets(text, [(None, None, mp_info)])[None]
+
+
+def match_names(text, name_list, phrase_list, mp_info={}, max_distance=0):
+    matcher = NameMatcher(name_list, phrase_list, max_distance)
+    return matcher.match(text, mp_info=mp_info)
+
+
+MINORITY = 'minority'
 
-def match_text_for_mandate(mandate, text):
-    mp_info = {'name': mandate.person.name}
 
+def get_vocabulary(key):
+    if key == MINORITY:
+        return get_minority_names()['search_names']
+    return get_county_data(key)['place_names']
+
+
+def get_max_distance():
+    """ Edit distance tolerated when matching names, to recover OCR errors.
+    0, the default, means exact matching. """
+    return flask.current_app.config.get('MPTRACKER_MATCH_MAX_DISTANCE', 0)
+
+
+@lru_cache(100)
+def get_county_matcher(geonames_code, max_distance=0):
+    return NameMatcher(get_vocabulary(geonames_code), other_phrases,
+                       max_distance)
+
+
+@lru_cache()
+def get_minority_matcher(max_distance=0):
+    return NameMatcher(get_vocabulary(MINORITY), other_phrases, max_distance)
+
+
+@lru_cache(10)
+def get_multi_matcher(keys, max_distance=0):
+    compiled = load_compiled_vocabulary()
+    if compiled is not None and not max_distance:
+        matcher = compiled['matcher']
+        if keys <= set(matcher.fingerprints):
+            return matcher
+    vocabularies = {key: get_vocabulary(key) for key in keys}
+    return MultiMatcher(vocabularies, other_phrases, max_distance)
+
+
+def get_matcher_key(mandate):
     if mandate.minority:
-        local_names = get_minority_names()['search_names']
+        return MINORITY
+    return mandate.county.geonames_code
+
 
-    else:
+def get_matcher(key):
+    if key == MINORITY:
+        return get_minority_matcher(get_max_distance())
+    return get_county_matcher(key, get_max_distance())
+
+
+def get_mp_info(mandate):
+    mp_info = {'name': mandate.person.name}
+    if not mandate.minority:
         county_data = get_county_data(mandate.county.geonames_code)
-        local_names = county_data['place_names']
         mp_info['county_name'] = county_data['name']
+    return mp_info
 
-    matches = match_names(text, local_names, other_phrases, mp_info=mp_info)
+
+def get_top_matches(matches):
     top_matches = sorted(matches,
                          key=lambda m: m['distance'],
                          reverse=True)[:10]
     return {'top_matches': top_matches}
+
+
+def match_text(matcher, text, mp_info):
+    return get_top_matches(matcher.match(text, mp_info=mp_info))
+
+
+def match_text_for_mandate(mandate, text):
+    matcher = get_matcher(get_matcher_key(mandate))
+    return match_text(matcher, text, get_mp_info(mandate))
+
+
+def mandate_fingerprint(vocabulary_fp, mp_info):
+    return hash_json([vocabulary_fp, mp_info])
+
+
+def match_fingerprint(mandate_fp, text_fp):
+    """ Identifies the vocabulary, MP details and text that a match was
+    computed from; if any of them changes, the match is stale. """
+    return '%s:%s' % (mandate_fp, text_fp)
+
+
+def fingerprint_for_mandate(mandate, text):
+    matcher = get_matcher(get_matcher_key(mandate))
+    mandate_fp = mandate_fingerprint(matcher.fingerprint, get_mp_info(mandate))
+    return match_fingerprint(mandate_fp, text_fingerprint(text))
+
+
+def match_document(matcher, text, targets):
+    """ Match a text once for all its `(row_id, key, mp_info)` targets.
+    Returns a list of `(row_id, result, fingerprint)` tuples. """
+    text_fp = text_fingerprint(text)
+    matches = matcher.match_targets(text, targets)
+    return [
+        (
+            row_id,
+            get_top_matches(matches[row_id]),
+            match_fingerprint(
+                mandate_fingerprint(matcher.fingerprints[key], mp_info),
+                text_fp,
+            ),
+        )
+        for row_id, key, mp_info in targets
+    ]
+
+
+def get_match_targets(mandate_list, minority_only=False):
+    """ Map the id of each mandate we can analyze to its matcher key and
+    `mp_info`, skipping those without a known county. """
+    rv = {}
+    for mandate in mandate_list:
+        if not mandate.minority:
+            county = mandate.county
+            if (minority_only or
+                county is None or
+                county.geonames_code is None):
+                continue
+        rv[mandate.id] = (get_matcher_key(mandate), get_mp_info(mandate))
+    return rv
+
+
+def get_target_fingerprints(targets):
+    # same as the matchers' fingerprints, without building the matchers
+    max_distance = get_max_distance()
+    vocabulary_fps = {}
+    rv = {}
+    for mandate_id, (key, mp_info) in targets.items():
+        if key not in vocabulary_fps:
+            vocabulary_fps[key] = vocabulary_fingerprint(
+                get_vocabulary(key), other_phrases, max_distance)
+        rv[mandate_id] = mandate_fingerprint(vocabulary_fps[key], mp_info)
+    return rv
+
+
+def match_text_for_mandates(text, row_mandates):
+    """ Match a text shared by several `(row_id, mandate)` pairs, like the
+    asks of a co-signed question, in a single pass. Mandates that can't be
+    analyzed are skipped. """
+    targets = get_match_targets(mandate for row_id, mandate in row_mandates)
+    document_targets = [
+        (row_id,) + targets[mandate.id]
+        for row_id, mandate in row_mandates
+        if mandate.id in targets
+    ]
+    keys = frozenset(key for row_id, key, mp_info in document_targets)
+    matcher = get_multi_matcher(keys, get_max_distance())
+    return match_document(matcher, text, document_targets)
+
+
+def group_documents(rows):
+    """ Group `(document_id, title, text, row_id, mandate_id)` rows, sorted
+    by document, into `(text, [(row_id, mandate_id), ...])` documents. """
+    for document_id, group in groupby(rows, lambda row: row[0]):
+        group = list(group)
+        (document_id, title, text) = group[0][:3]
+        yield (title + ' ' + text, [tuple(row[3:]) for row in group])
+
+
+class CountyIndex(MultiMatcher):
+    """ Place names of all counties, without the `other_phrases`, so that a
+    text can be scanned once to find every county it mentions. """
+
+    def __init__(self, county_data_list):
+        super().__init__({
+            county_data['code']: county_data['place_names']
+            for county_data in county_data_list
+        }, [])
+        self.county_names = {
+            county_data['code']: normalize(county_data['name'])
+            for county_data in county_data_list
+        }
+
+    def count_mentions(self, text):
+        """ Count the place name matches for each county mentioned in
+        `text`. A county's own name is ignored when it's part of a
+        signature, like "Deputat PSD Cluj". """
+        (tokens, plain, stemmed) = self.prepare_text(text)
+        signature_bits = set(normalize(word) for word in signature_stop_words)
+        recent_words = deque(maxlen=self.MP_TITLE_LOOKBEHIND_TOKENS)
+        counts = defaultdict(int)
+        for idx in range(len(tokens)):
+            top = self.find_top_matches(tokens, plain, stemmed, idx)
+            for code, (name, end, edits) in top.items():
+                if (normalize(name) == self.county_names[code] and
+                        signature_bits.intersection(recent_words)):
+                    continue
+                counts[code] += 1
+            recent_words.append(plain[idx])
+        return dict(counts)
+
+
+@lru_cache()
+def get_county_index():
+    compiled = load_compiled_vocabulary()
+    if compiled is not None:
+        return compiled['county_index']
+    return CountyIndex([get_county_data(code) for code in list_county_codes()])
+
+
+COMPILED_VOCABULARY_NAME = 'vocabulary.pickle'
+
+
+def get_placename_data_path():
+    return path(__file__).abspath().parent / 'placename_data'
+
+
+def get_vocabulary_source(data_path):
+    return sorted((f.name, f.size, f.mtime) for f in data_path.files('*.json'))
+
+
+def get_phrase_lists_fingerprint():
+    # the compiled matchers depend on these module-level lists too
+    return hash_json([
+        vocabulary_fingerprint([], other_phrases),
+        name_normalization_map,
+    ])
+
+
+def compile_vocabulary():
+    """ Normalize the names of all counties and minorities into tries and
+    save them, so that workers load them in one go instead of reading and
+    normalizing each JSON file. """
+    data_path = get_placename_data_path()
+    county_data_list = [get_county_data(code) for code in list_county_codes()]
+    vocabularies = {c['code']: c['place_names'] for c in county_data_list}
+    vocabularies[MINORITY] = get_vocabulary(MINORITY)
+    compiled = {
+        'version': MultiMatcher.VERSION,
+        'source': get_vocabulary_source(data_path),
+        'phrase_lists': get_phrase_lists_fingerprint(),
+        'matcher': MultiMatcher(vocabularies, other_phrases),
+        'county_index': CountyIndex(county_data_list),
+    }
+    compiled_path = data_path / COMPILED_VOCABULARY_NAME
+    with compiled_path.open('wb') as f:
+        pickle.dump(compiled, f, pickle.HIGHEST_PROTOCOL)
+    return compiled_path
+
+
+@lru_cache()
+def load_compiled_vocabulary():
+    """ Load the vocabulary saved by `compile_vocabulary`. Returns `None`
+    if it's missing, or if the JSON files or the phrase and stop word lists
+    changed since it was saved. """
+    data_path = get_placename_data_path()
+    compiled_path = data_path / COMPILED_VOCABULARY_NAME
+    if not compiled_path.isfile():
+        return None
+    with compiled_path.open('rb') as f:
+        compiled = pickle.load(f)
+    if (compiled['version'] != MultiMatcher.VERSION or
+            compiled['source'] != get_vocabulary_source(data_path) or
+            compiled.get('phrase_lists') != get_phrase_lists_fingerprint()):
+        logger.warning("Compiled vocabulary %s is out of date, ignoring it",
+                       compiled_path)
+        return None
+    return compiled
+
+
+_pool_matcher = []
+
+
+def _init_pool_worker(matcher):
+    _pool_matcher[:] = [matcher]
+
+
+def _match_pool_job(job):
+    (text, targets) = job
+    return match_document(_pool_matcher[0], text, targets)
+
+
+def _count_mentions_pool_job(job):
+    (document_id, text) = job
+    return (document_id, _pool_matcher[0].count_mentions(text))
+
+
+def _map_in_pool(job_func, jobs, matcher, processes, batch_size):
+    # the matcher is built before the workers are forked, so each worker
+    # starts with all vocabularies loaded
+    pool = multiprocessing.Pool(processes, _init_pool_worker, (matcher,))
+    try:
+        while True:
+            batch = list(islice(jobs, batch_size))
+            if not batch:
+                break
+            yield pool.map(job_func, batch)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def match_in_pool(documents, targets, processes=None, batch_size=100):
+    """ Match `(text, [(row_id, mandate_id), ...])` documents in a pool of
+    worker processes. Yields a list of `(row_id, result, fingerprint)`
+    tuples for every batch. """
+    keys = frozenset(key for key, mp_info in targets.values())
+    jobs = (
+        (text, [(row_id,) + targets[mandate_id]
+                for row_id, mandate_id in row_mandates])
+        for text, row_mandates in documents
+    )
+    matcher = get_multi_matcher(keys, get_max_distance())
+    batches = _map_in_pool(_match_pool_job, jobs, matcher, processes,
+                           batch_size)
+    for batch in batches:
+        yield [row for rows in batch for row in rows]
+
+
+def count_mentions_in_pool(documents, processes=None, batch_size=100):
+    """ Count county mentions in `(document_id, text)` documents in a pool
+    of worker processes. Yields a list of `(document_id, counts)` tuples
+    for every batch. """
+    return _map_in_pool(_count_mentions_pool_job, documents,
+                        get_county_index(), processes, batch_size)
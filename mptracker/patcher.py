@@ -1,6 +1,7 @@
 from collections import namedtuple
 from contextlib import contextmanager
 import logging
+from sqlalchemy import tuple_
 
 
 class RowNotFound(Exception):
@@ -23,11 +24,35 @@ class TablePatcher:
         self.session = session
         self.key_columns = key_columns
         self.seen = set()
+        self.preloaded = {}
 
     def _dict_key(self, record):
         return tuple(record.get(k) for k in self.key_columns)
 
+    def _row_key(self, row):
+        return tuple(getattr(row, k) for k in self.key_columns)
+
+    def preload(self, records):
+        """ Look up the rows of all `records` with one query, so that
+        adding them doesn't need a query for each one """
+        keys = set(self._dict_key(record) for record in records)
+        if not keys:
+            return
+        if len(self.key_columns) == 1:
+            column = getattr(self.model, self.key_columns[0])
+            condition = column.in_([key[0] for key in keys])
+        else:
+            columns = [getattr(self.model, k) for k in self.key_columns]
+            condition = tuple_(*columns).in_(list(keys))
+        self.session.flush()
+        for key in keys:
+            self.preloaded[key] = None
+        for row in self.model.query.filter(condition):
+            self.preloaded[self._row_key(row)] = row
+
     def _get_row_for_key(self, key):
+        if key in self.preloaded:
+            return self.preloaded.pop(key)
         self.session.flush()
         return (
             self.model.query
@@ -97,6 +97,17 @@ def load_placenames():
         logger.info("Saved county %s (%s) with %d names",
                     county['name'], county['code'], len(county['place_names']))
 
+    get_county_data.cache_clear()
+    compile_vocabulary()
+
+
+@placenames_manager.command
+def compile_vocabulary():
+    """ Save the normalized vocabulary of all counties in a single file """
+    from mptracker import nlp
+    compiled_path = nlp.compile_vocabulary()
+    logger.info("Saved compiled vocabulary to %s", compiled_path)
+
 
 @lru_cache(100)
 def get_county_data(code):
@@ -107,6 +118,12 @@ def get_county_data(code):
         return flask.json.load(f)
 
 
+@lru_cache()
+def list_county_codes():
+    data_path = path(flask.current_app.root_path) / 'placename_data'
+    return sorted(int(p.namebase) for p in data_path.files('[0-9][0-9].json'))
+
+
 @placenames_manager.command
 def expand_minority_names():
     from mptracker.scraper.common import Scraper, get_cached_session, pqitems
@@ -1,11 +1,18 @@
 from time import sleep
+from itertools import islice
 import logging
 import flask
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 from flask.ext.script import Manager
 from flask.ext.rq import job
 from mptracker import models
 from mptracker.common import ocr_url
-from mptracker.nlp import match_text_for_mandate
+from mptracker.nlp import (match_text_for_mandate, match_text_for_mandates,
+                           match_in_pool, group_documents,
+                           get_match_targets, get_target_fingerprints,
+                           match_fingerprint, fingerprint_for_mandate)
+from mptracker.mentions import index_document
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -69,15 +76,8 @@ def ocr_proposal(proposal_id, autoanalyze=False):
     logger.info("done OCR for %s (%d pages)", proposal, len(pages))
 
     if autoanalyze:
-        sponsorships = proposal.sponsorships.all()
-        logger.info("scheduling analysis for %d mandates", len(sponsorships))
-        for sp in sponsorships:
-            mandate = sp.mandate
-            if not mandate.minority:
-                if (mandate.county is None or
-                    mandate.county.geonames_code is None):
-                    continue
-            analyze_sponsorship.delay(sp.id)
+        analyze_proposal.delay(proposal.id)
+        index_document.delay('proposal', proposal.id)
 
 
 @proposals_manager.command
@@ -108,13 +108,54 @@ def analyze_sponsorship(sponsorship_id):
     text = proposal.title + ' ' + proposal.text
     result = match_text_for_mandate(sponsorship.mandate, text)
     sponsorship.match.data = flask.json.dumps(result)
+    sponsorship.match.fingerprint = fingerprint_for_mandate(
+        sponsorship.mandate, text)
     if not sponsorship.match.manual:
-        sponsorship.match.score = ask.match.get_score_from_data()
+        sponsorship.match.score = sponsorship.match.get_score_from_data()
     models.db.session.commit()
 
 
+@job
+@proposals_manager.command
+def analyze_proposal(proposal_id):
+    """ Match the proposal text once for all its sponsors """
+    proposal = models.Proposal.query.get(proposal_id)
+    text = proposal.title + ' ' + proposal.text
+    sponsorships = [(sp.id, sp.mandate) for sp in proposal.sponsorships]
+    results = match_text_for_mandates(text, sponsorships)
+    models.Match.save_batch('sponsorship', results)
+    models.db.session.commit()
+    logger.info("analyzed %s for %d mandates", proposal, len(results))
+
+
 @proposals_manager.command
-def analyze_all(number=None, force=False, minority_only=False):
+def analyze_all(number=None, force=False, minority_only=False,
+                inline=False, processes=None, stale=False):
+    if inline or stale:
+        mandate_query = (
+            models.Mandate.query
+            .options(joinedload('person'), joinedload('county'))
+        )
+        targets = get_match_targets(mandate_query, minority_only)
+
+    sponsorship_ids = None
+    if stale:
+        sponsorship_ids = find_stale_sponsorships(targets)
+        logger.info("found %d stale matches", len(sponsorship_ids))
+
+    if inline:
+        return analyze_all_inline(targets, number, force,
+                                  processes and int(processes),
+                                  sponsorship_ids)
+
+    if stale:
+        if number:
+            sponsorship_ids = sponsorship_ids[:int(number)]
+        for sponsorship_id in sponsorship_ids:
+            analyze_sponsorship.delay(sponsorship_id)
+        logger.info("enqueued %d jobs", len(sponsorship_ids))
+        return
+
     n_jobs = n_skip = n_ok = 0
     text_row_ids = models.OcrText.all_ids_for('proposal')
     for sponsorship in models.Sponsorship.query:
@@ -137,3 +178,74 @@ def analyze_all(number=None, force=False, minority_only=False):
         if number and n_jobs >= int(number):
             break
     logger.info("enqueued %d jobs, skipped %d, ok %d", n_jobs, n_skip, n_ok)
+
+
+def find_stale_sponsorships(targets):
+    """ Ids of sponsorships whose match is missing, or was computed from
+    another vocabulary, MP details or proposal text than the current
+    ones. """
+    mandate_fingerprints = get_target_fingerprints(targets)
+    query = (
+        models.db.session.query(
+            models.Sponsorship.id,
+            models.Sponsorship.mandate_id,
+            func.md5(models.Proposal.title + ' ' + models.OcrText.text),
+            models.Match.fingerprint,
+        )
+        .join(models.Sponsorship.proposal)
+        .join(models.OcrText, models.OcrText.id == models.Proposal.id)
+        .outerjoin(models.Match, models.Match.id == models.Sponsorship.id)
+        .filter(models.OcrText.text != None)
+        .filter(models.Sponsorship.mandate_id.in_(list(targets)))
+    )
+    return [
+        sponsorship_id
+        for sponsorship_id, mandate_id, text_fp, fingerprint in query
+        if fingerprint != match_fingerprint(mandate_fingerprints[mandate_id],
+                                            text_fp)
+    ]
+
+
+def analyze_all_inline(targets, number=None, force=False, processes=None,
+                       sponsorship_ids=None):
+    text_query = (
+        models.db.session.query(
+            models.Proposal.id,
+            models.Proposal.title,
+            models.OcrText.text,
+            models.Sponsorship.id,
+            models.Sponsorship.mandate_id,
+        )
+        .join(models.Sponsorship.proposal)
+        .join(models.OcrText, models.OcrText.id == models.Proposal.id)
+        .filter(models.OcrText.text != None)
+        .filter(models.Sponsorship.mandate_id.in_(list(targets)))
+    )
+    if sponsorship_ids is not None:
+        text_query = text_query.filter(
+            models.Sponsorship.id.in_(sponsorship_ids))
+    elif not force:
+        text_query = (
+            text_query
+            .outerjoin(models.Match, models.Match.id == models.Sponsorship.id)
+            .filter(models.Match.data == None)
+        )
+
+    text_query = text_query.order_by(models.Proposal.id)
+
+    connection = models.db.engine.connect()
+    rows = (connection.execution_options(stream_results=True)
+                      .execute(text_query.statement))
+    documents = group_documents(rows)
+    if number:
+        documents = islice(documents, int(number))
+
+    n_done = 0
+    try:
+        for results in match_in_pool(documents, targets, processes):
+            models.Match.save_batch('sponsorship', results)
+            models.db.session.commit()
+            n_done += len(results)
+            logger.info("analyzed %d sponsorships", n_done)
+    finally:
+        connection.close()
@@ -2,12 +2,17 @@ import logging
 from collections import defaultdict
 from sqlalchemy import func
 from sqlalchemy.orm import joinedload
+from itertools import islice
 import flask
 from flask.ext.script import Manager
 from flask.ext.rq import job
 from mptracker import models
 from mptracker.common import ocr_url, csv_lines, buffer_on_disk
-from mptracker.nlp import match_text_for_mandate
+from mptracker.nlp import (match_text_for_mandate, match_text_for_mandates,
+                           match_in_pool, group_documents,
+                           get_match_targets, get_target_fingerprints,
+                           match_fingerprint, fingerprint_for_mandate)
+from mptracker.mentions import index_document
 from mptracker.auth import require_privilege
 
 
@@ -31,15 +36,8 @@ def ocr_question(question_id, autoanalyze=False):
     logger.info("done OCR for %s (%d pages)", question, len(pages))
 
     if autoanalyze:
-        asked = question.asked.all()
-        logger.info("scheduling analysis for %d mandates", len(asked))
-        for ask in asked:
-            mandate = ask.mandate
-            if not mandate.minority:
-                if (mandate.county is None or
-                    mandate.county.geonames_code is None):
-                    continue
-            analyze.delay(ask.id)
+        analyze_question.delay(question.id)
+        index_document.delay('question', question.id)
 
 
 @questions_manager.command
@@ -71,13 +69,52 @@ def analyze(ask_id):
     text = ask.question.title + ' ' + ask.question.text
     result = match_text_for_mandate(ask.mandate, text)
     ask.match.data = flask.json.dumps(result)
+    ask.match.fingerprint = fingerprint_for_mandate(ask.mandate, text)
     if not ask.match.manual:
         ask.match.score = ask.match.get_score_from_data()
     models.db.session.commit()
 
 
+@job
+@questions_manager.command
+def analyze_question(question_id):
+    """ Match the question text once for all the MPs who asked it """
+    question = models.Question.query.get(question_id)
+    text = question.title + ' ' + question.text
+    asked = [(ask.id, ask.mandate) for ask in question.asked]
+    results = match_text_for_mandates(text, asked)
+    models.Match.save_batch('ask', results)
+    models.db.session.commit()
+    logger.info("analyzed %s for %d mandates", question, len(results))
+
+
 @questions_manager.command
-def analyze_all(number=None, force=False, minority_only=False):
+def analyze_all(number=None, force=False, minority_only=False,
+                inline=False, processes=None, stale=False):
+    if inline or stale:
+        mandate_query = (
+            models.Mandate.query
+            .options(joinedload('person'), joinedload('county'))
+        )
+        targets = get_match_targets(mandate_query, minority_only)
+
+    ask_ids = None
+    if stale:
+        ask_ids = find_stale_asks(targets)
+        logger.info("found %d stale matches", len(ask_ids))
+
+    if inline:
+        return analyze_all_inline(targets, number, force,
+                                  processes and int(processes), ask_ids)
+
+    if stale:
+        if number:
+            ask_ids = ask_ids[:int(number)]
+        for ask_id in ask_ids:
+            analyze.delay(ask_id)
+        logger.info("enqueued %d jobs", len(ask_ids))
+        return
+
     text_row_ids = models.OcrText.all_ids_for('question')
     def has_text(question):
         return question.id in text_row_ids
@@ -110,6 +147,75 @@ def analyze_all(number=None, force=False, minority_only=False):
     logger.info("enqueued %d jobs, skipped %d, ok %d", n_jobs, n_skip, n_ok)
 
 
+def find_stale_asks(targets):
+    """ Ids of asks whose match is missing, or was computed from another
+    vocabulary, MP details or question text than the current ones. """
+    mandate_fingerprints = get_target_fingerprints(targets)
+    query = (
+        models.db.session.query(
+            models.Ask.id,
+            models.Ask.mandate_id,
+            func.md5(models.Question.title + ' ' + models.OcrText.text),
+            models.Match.fingerprint,
+        )
+        .join(models.Ask.question)
+        .join(models.OcrText, models.OcrText.id == models.Question.id)
+        .outerjoin(models.Match, models.Match.id == models.Ask.id)
+        .filter(models.OcrText.text != None)
+        .filter(models.Ask.mandate_id.in_(list(targets)))
+    )
+    return [
+        ask_id
+        for ask_id, mandate_id, text_fp, fingerprint in query
+        if fingerprint != match_fingerprint(mandate_fingerprints[mandate_id],
+                                            text_fp)
+    ]
+
+
+def analyze_all_inline(targets, number=None, force=False, processes=None,
+                       ask_ids=None):
+    text_query = (
+        models.db.session.query(
+            models.Question.id,
+            models.Question.title,
+            models.OcrText.text,
+            models.Ask.id,
+            models.Ask.mandate_id,
+        )
+        .join(models.Ask.question)
+        .join(models.OcrText, models.OcrText.id == models.Question.id)
+        .filter(models.OcrText.text != None)
+        .filter(models.Ask.mandate_id.in_(list(targets)))
+    )
+    if ask_ids is not None:
+        text_query = text_query.filter(models.Ask.id.in_(ask_ids))
+    elif not force:
+        text_query = (
+            text_query
+            .outerjoin(models.Match, models.Match.id == models.Ask.id)
+            .filter(models.Match.id == None)
+        )
+
+    text_query = text_query.order_by(models.Question.id)
+
+    connection = models.db.engine.connect()
+    rows = (connection.execution_options(stream_results=True)
+                      .execute(text_query.statement))
+    documents = group_documents(rows)
+    if number:
+        documents = islice(documents, int(number))
+
+    n_done = 0
+    try:
+        for results in match_in_pool(documents, targets, processes):
+            models.Match.save_batch('ask', results)
+            models.db.session.commit()
+            n_done += len(results)
+            logger.info("analyzed %d asks", n_done)
+    finally:
+        connection.close()
+
+
 @questions.route('/questions/')
 def mandate_index():
     from sqlalchemy import func
@@ -1,15 +1,17 @@
 import logging
 from datetime import timedelta, date, datetime
 from collections import defaultdict
+from contextlib import contextmanager
 import flask
 from flask.ext.script import Manager
 from psycopg2.extras import DateRange
 from path import path
-import requests
 from mptracker.scraper.common import get_cached_session, create_session, \
-                                     get_gdrive_csv, parse_interval
+                                     get_gdrive_csv, parse_interval, \
+                                     DocumentCache, HttpMetrics, PROJECT_ROOT
 from mptracker import models
-from mptracker.common import parse_date, model_to_dict, url_args
+from mptracker.common import (parse_date, model_to_dict, url_args,
+                              PARLIAMENT_VACATIONS)
 from mptracker.patcher import TablePatcher
 
 logger = logging.getLogger(__name__)
@@ -39,6 +41,112 @@ CABINET_PARTY_CSV_KEY = '0AlBmcLkxpBOXdEpZVzZ5MUNvb004b0Z3UGFZUjdzMUE'
 POLICY_DOMAIN_CSV_KEY = '0AlBmcLkxpBOXdGNXcUtNZ2xHYlpEa1NvWmg2MUNBYVE'
 STOP_WORDS_CSV_KEY = '0AlBmcLkxpBOXdDRtTExMWDh1Mm1IQ3dVQ085RkJudGc'
 
+_run_documents = None
+
+
+def get_run_documents():
+    """ Pages parsed so far in this run, shared by all the scrapers """
+    global _run_documents
+    if _run_documents is None:
+        max_mb = flask.current_app.config.get(
+            'MPTRACKER_SCRAPER_DOCUMENT_CACHE_MB', 100)
+        _run_documents = DocumentCache(int(max_mb) * 2 ** 20)
+    return _run_documents
+
+
+def save_metrics(command, metrics, failed=False):
+    """ Log a summary of the command's HTTP metrics and save them all as
+    JSON in `_data/metrics` """
+    total = metrics.total()
+    logger.info("HTTP%s: %d kb in %d requests (%d from cache), "
+                "%.2f seconds downloading, %.2f seconds throttled",
+                " (failed run)" if failed else "",
+                total['bytes'] / 1024, total['requests'], total['cache_hits'],
+                total['download_time'], total['throttle_wait'])
+
+    now = datetime.utcnow()
+    metrics_dir = PROJECT_ROOT / '_data' / 'metrics'
+    metrics_dir.makedirs_p()
+    metrics_path = metrics_dir / ('%s-%s.json'
+                                  % (command, now.strftime('%Y%m%dT%H%M%S')))
+    data = dict(metrics.as_json(), command=command, time=now.isoformat(),
+                failed=failed)
+    with open(metrics_path, 'w', encoding='utf-8') as f:
+        flask.json.dump(data, f, indent=2, sort_keys=True)
+        f.write('\n')
+    logger.info("HTTP metrics saved to %s", metrics_path)
+
+
+@contextmanager
+def recorded_metrics(command):
+    """ HTTP metrics for a command, saved when it finishes, even if it
+    fails """
+    metrics = HttpMetrics()
+    failed = True
+    try:
+        yield metrics
+        failed = False
+    finally:
+        save_metrics(command, metrics, failed)
+
+
+class ProgressJournal:
+    """ Records the work a scraper command has finished, committed together
+    with the scraped data, so that an interrupted run can be continued with
+    `--resume`. A run that doesn't resume discards the previous journal. """
+
+    def __init__(self, command, resume=False):
+        self.command = command
+        self.entries = {}
+        if resume:
+            for row in self._query():
+                self.entries[row.key] = row.data
+            logger.info("Resuming %s, %d steps done",
+                        command, len(self.entries))
+        else:
+            self._query().delete()
+
+    def _query(self):
+        return models.ScraperCheckpoint.query.filter_by(command=self.command)
+
+    def __contains__(self, key):
+        return str(key) in self.entries
+
+    def get(self, key, default=None):
+        return self.entries.get(str(key), default)
+
+    def record(self, key, data=None):
+        models.db.session.add(models.ScraperCheckpoint(
+            command=self.command, key=str(key), data=data))
+        self.entries[str(key)] = data
+
+    def finish(self):
+        self._query().delete()
+        self.entries = {}
+
+
+def parse_years(text):
+    """ `"2012-2014"` -> `[2012, 2013, 2014]`, `"2012,2014"` ->
+    `[2012, 2014]` """
+    years = []
+    for item in str(text).split(','):
+        (first, dash, last) = item.partition('-')
+        years.extend(range(int(first), int(last or first) + 1))
+    return years
+
+
+def is_question_current(known, index_digest, pending_since):
+    """ Whether a question we have, `known` as `(index_digest, answered,
+    date)`, can be skipped. Questions are fetched again when their index
+    row changed, or when they are newer than `pending_since` and still
+    waiting for an answer. """
+    if known is None:
+        return False
+    (old_index_digest, answered, question_date) = known
+    if old_index_digest != index_digest:
+        return False
+    return answered or question_date < pending_since
+
 
 @scraper_manager.command
 def questions(
@@ -46,74 +154,93 @@ def questions(
         reimport_existing=False,
         cache_name=None,
         throttle=None,
+        concurrency=None,
+        revalidate=False,
+        archive=False,
+        replay=False,
         autoanalyze=False,
+        pending_days=90,
         ):
     from mptracker.scraper.questions import QuestionScraper
     from mptracker.questions import ocr_question
     from mptracker.policy import calculate_question
 
     if reimport_existing:
-        known_urls = set()
+        known = {}
     else:
-        url_query = models.db.session.query(models.Question.url)
-        known_urls = set(row[0] for row in url_query)
-
-    def skip_question(url):
-        return url in known_urls
-
-    http_session = create_session(cache_name=cache_name,
-                                  throttle=throttle and float(throttle),
-                                  counters=True)
-    questions_scraper = QuestionScraper(session=http_session,
-                                        skip=skip_question)
-
-    mandate_lookup = models.MandateLookup()
-
-    question_patcher = TablePatcher(models.Question,
-                                    models.db.session,
-                                    key_columns=['number', 'date'])
-
-    new_ask_rows = 0
-
-    changed = []
-
-    with question_patcher.process() as add:
-        for question in questions_scraper.run(int(year)):
-            person_list = question.pop('person')
-            question['addressee'] = '; '.join(question['addressee'])
-            result = add(question)
-            q = result.row
-
-            old_asked = {ask.mandate_id: ask for ask in q.asked}
-            for name, person_year, person_number in person_list:
-                mandate = mandate_lookup.find(name, person_year, person_number)
-                if mandate.id in old_asked:
-                    old_asked.pop(mandate.id)
-
-                else:
-                    ask = models.Ask(mandate=mandate)
-                    q.asked.append(ask)
-                    ask.set_meta('new', True)
-                    logger.info("Adding ask for %s: %s", q, mandate)
-                    new_ask_rows += 1
+        known_query = models.db.session.query(
+            models.Question.url,
+            models.Question.index_digest,
+            models.Question.answered,
+            models.Question.date,
+        )
+        known = {row[0]: row[1:] for row in known_query}
+    pending_since = date.today() - timedelta(days=int(pending_days))
+    old_pdf_url = dict(
+        models.db.session.query(models.Question.url, models.Question.pdf_url))
+
+    def skip_question(url, index_digest):
+        return is_question_current(known.get(url), index_digest,
+                                   pending_since)
+
+    with recorded_metrics('questions') as metrics:
+        http_session = create_session(cache_name=cache_name,
+                                      throttle=throttle and float(throttle),
+                                      metrics=metrics,
+                                      concurrency=int(concurrency or 1),
+                                      revalidate=revalidate,
+                                      archive=archive,
+                                      replay=replay,
+                                      documents=get_run_documents())
+        questions_scraper = QuestionScraper(session=http_session,
+                                            skip=skip_question)
+
+        mandate_lookup = models.MandateLookup()
+
+        question_patcher = TablePatcher(models.Question,
+                                        models.db.session,
+                                        key_columns=['number', 'date'])
+
+        new_ask_rows = 0
+
+        # questions with a new PDF; refreshing `index_digest` or `answered`
+        # is no reason to OCR one again
+        changed = []
+
+        with question_patcher.process() as add:
+            for question in questions_scraper.run(*parse_years(year)):
+                person_list = question.pop('person')
+                question['addressee'] = '; '.join(question['addressee'])
+                result = add(question)
+                q = result.row
+
+                old_asked = {ask.mandate_id: ask for ask in q.asked}
+                for name, person_year, person_number in person_list:
+                    mandate = mandate_lookup.find(name, person_year,
+                                                  person_number)
+                    if mandate.id in old_asked:
+                        old_asked.pop(mandate.id)
 
-            if result.is_changed:
-                changed.append(q)
+                    else:
+                        ask = models.Ask(mandate=mandate)
+                        q.asked.append(ask)
+                        ask.set_meta('new', True)
+                        logger.info("Adding ask for %s: %s", q, mandate)
+                        new_ask_rows += 1
 
-            if old_asked:
-                logger.warn("Removing %d old 'ask' records", len(old_asked))
-                for ask in old_asked.values():
-                    models.db.session.delete(ask)
+                if result.is_new or q.pdf_url != old_pdf_url.get(q.url):
+                    changed.append(q)
 
-    models.db.session.commit()
+                if old_asked:
+                    logger.warn("Removing %d old 'ask' records",
+                                len(old_asked))
+                    for ask in old_asked.values():
+                        models.db.session.delete(ask)
 
-    if new_ask_rows:
-        logger.info("Added %d ask records", new_ask_rows)
+        models.db.session.commit()
 
-    counters = http_session.counters
-    logger.info("HTTP: %d kb in %s requests, %.2f seconds",
-                counters['bytes'] / 1024, counters['requests'],
-                counters['download_time'].total_seconds())
+        if new_ask_rows:
+            logger.info("Added %d ask records", new_ask_rows)
 
     if autoanalyze:
         logger.info("Scheduling jobs for %d questions", len(changed))
@@ -130,94 +257,103 @@ def people(
     year='2012',
     cache_name=None,
     throttle=None,
+    concurrency=None,
     no_commit=False,
     add_people=False,
+    archive=False,
+    replay=False,
 ):
     from mptracker.scraper.people import MandateScraper
 
-    http_session = create_session(
-        cache_name=cache_name,
-        throttle=throttle and float(throttle),
-    )
-    mandate_scraper = MandateScraper(http_session)
+    with recorded_metrics('people') as metrics:
+        http_session = create_session(
+            cache_name=cache_name,
+            throttle=throttle and float(throttle),
+            concurrency=int(concurrency or 1),
+            archive=archive,
+            replay=replay,
+            metrics=metrics,
+            documents=get_run_documents(),
+        )
+        mandate_scraper = MandateScraper(http_session)
 
-    mandate_patcher = TablePatcher(
-        models.Mandate,
-        models.db.session,
-        key_columns=['year', 'cdep_number'],
-    )
+        mandate_patcher = TablePatcher(
+            models.Mandate,
+            models.db.session,
+            key_columns=['year', 'cdep_number'],
+        )
 
-    person_patcher = TablePatcher(
-        models.Person,
-        models.db.session,
-        key_columns=['id'],
-    )
+        person_patcher = TablePatcher(
+            models.Person,
+            models.db.session,
+            key_columns=['id'],
+        )
 
-    term_interval = TERM_INTERVAL[int(year)]
-    new_people = 0
-    chamber_by_slug = {c.slug: c for c in models.Chamber.query}
-
-    with mandate_patcher.process() as add_mandate, \
-         person_patcher.process() as add_person:
-        for mandate in mandate_scraper.fetch(year):
-            row = mandate.as_dict([
-                'year',
-                'cdep_number',
-                'minority',
-                'college',
-                'constituency',
-                'picture_url',
-            ])
-            assert mandate.chamber_number == 2
-            row['chamber_id'] = chamber_by_slug['cdep'].id
-            end_date = mandate.end_date or term_interval.upper
-            row['interval'] = DateRange(term_interval.lower, end_date)
-
-            person = (
-                models.Person.query
-                    .filter_by(name=mandate.person_name)
-                    .first())
-
-            if person is None:
-                if add_people:
-                    person = models.Person(name=mandate.person_name)
-                    models.db.session.add(person)
-                    models.db.session.flush()
-                    new_people += 1
+        term_interval = TERM_INTERVAL[int(year)]
+        new_people = 0
+        chamber_by_slug = {c.slug: c for c in models.Chamber.query}
+
+        with mandate_patcher.process() as add_mandate, \
+             person_patcher.process() as add_person:
+            for mandate in mandate_scraper.fetch(year):
+                row = mandate.as_dict([
+                    'year',
+                    'cdep_number',
+                    'minority',
+                    'college',
+                    'constituency',
+                    'picture_url',
+                ])
+                assert mandate.chamber_number == 2
+                row['chamber_id'] = chamber_by_slug['cdep'].id
+                end_date = mandate.end_date or term_interval.upper
+                row['interval'] = DateRange(term_interval.lower, end_date)
+
+                person = (
+                    models.Person.query
+                        .filter_by(name=mandate.person_name)
+                        .first())
 
-                else:
-                    raise RuntimeError("Can't find person named %r"
-                                       % mandate.person_name)
+                if person is None:
+                    if add_people:
+                        person = models.Person(name=mandate.person_name)
+                        models.db.session.add(person)
+                        models.db.session.flush()
+                        new_people += 1
 
-            assert not add_person({
-                'id': person.id,
-                'first_name': mandate.person_first_name,
-                'last_name': mandate.person_last_name,
-            }).is_new
+                    else:
+                        raise RuntimeError("Can't find person named %r"
+                                           % mandate.person_name)
 
-            row['person_id'] = person.id
+                assert not add_person({
+                    'id': person.id,
+                    'first_name': mandate.person_first_name,
+                    'last_name': mandate.person_last_name,
+                }).is_new
 
-            if not mandate.minority:
-                county = (
-                    models.County.query
-                        .filter_by(name=mandate.county_name)
-                        .first())
-                if county is None:
-                    raise RuntimeError("Can't match county name %r"
-                                       % mandate.county_name)
-                row['county'] = county
+                row['person_id'] = person.id
 
-            add_mandate(row)
+                if not mandate.minority:
+                    county = (
+                        models.County.query
+                            .filter_by(name=mandate.county_name)
+                            .first())
+                    if county is None:
+                        raise RuntimeError("Can't match county name %r"
+                                           % mandate.county_name)
+                    row['county'] = county
 
-    if new_people:
-        logger.info("%d new people", new_people)
+                add_mandate(row)
 
-    if no_commit:
-        logger.warn("Rolling back the transaction")
-        models.db.session.rollback()
+        if new_people:
+            logger.info("%d new people", new_people)
 
-    else:
-        models.db.session.commit()
+        if no_commit:
+            logger.warn("Rolling back the transaction")
+            models.db.session.rollback()
+
+        else:
+            models.db.session.commit()
 
 
 @scraper_manager.command
@@ -225,29 +361,31 @@ def download_pictures(year='2012'):
     import subprocess
     localdir = path(flask.current_app.static_folder) / 'mandate-pictures'
     localdir.mkdir_p()
-    for mandate in models.Mandate.query.filter_by(year=int(year)):
-        if mandate.picture_url is not None:
-            assert mandate.picture_url.endswith('.jpg')
-            local_path = localdir / ('%s.jpg' % mandate.id)
-            if not local_path.isfile():
-                resp = requests.get(mandate.picture_url)
-                assert resp.headers['Content-Type'] == 'image/jpeg'
-                with local_path.open('wb') as f:
-                    f.write(resp.content)
-                logger.info('Saved %s (%d bytes)',
-                            local_path.name, len(resp.content))
-
-            thumb_path = localdir / ('%s-300px.jpg' % mandate.id)
-            if not thumb_path.isfile():
-                subprocess.check_call([
-                    'convert',
-                    local_path,
-                    '-geometry', '300x300^',
-                    '-quality', '85',
-                    thumb_path,
-                ])
-                logger.info('Resized %s (%d bytes)',
-                            thumb_path.name, thumb_path.stat().st_size)
+    with recorded_metrics('download_pictures') as metrics:
+        http_session = create_session(metrics=metrics)
+        for mandate in models.Mandate.query.filter_by(year=int(year)):
+            if mandate.picture_url is not None:
+                assert mandate.picture_url.endswith('.jpg')
+                local_path = localdir / ('%s.jpg' % mandate.id)
+                if not local_path.isfile():
+                    resp = http_session.get(mandate.picture_url)
+                    assert resp.headers['Content-Type'] == 'image/jpeg'
+                    with local_path.open('wb') as f:
+                        f.write(resp.content)
+                    logger.info('Saved %s (%d bytes)',
+                                local_path.name, len(resp.content))
+
+                thumb_path = localdir / ('%s-300px.jpg' % mandate.id)
+                if not thumb_path.isfile():
+                    subprocess.check_call([
+                        'convert',
+                        local_path,
+                        '-geometry', '300x300^',
+                        '-quality', '85',
+                        thumb_path,
+                    ])
+                    logger.info('Resized %s (%d bytes)',
+                                thumb_path.name, thumb_path.stat().st_size)
 
 
 @scraper_manager.command
@@ -256,126 +394,134 @@ def groups(
         throttle=None,
         no_commit=False,
         year='2012',
+        archive=False,
+        replay=False,
         ):
     year = int(year)
 
     from mptracker.scraper.groups import GroupScraper, Interval
 
-    http_session = create_session(cache_name=cache_name,
-                                  throttle=throttle and float(throttle))
-    group_scraper = GroupScraper(http_session)
+    with recorded_metrics('groups') as metrics:
+        http_session = create_session(cache_name=cache_name,
+                                      throttle=throttle and float(throttle),
+                                      archive=archive,
+                                      replay=replay,
+                                      metrics=metrics,
+                                      documents=get_run_documents())
+        group_scraper = GroupScraper(http_session)
+
+        mandate_lookup = models.MandateLookup()
+        mandate_intervals = defaultdict(list)
+        term_interval = TERM_INTERVAL[year]
+
+        groups = list(group_scraper.fetch(year))
+        independents = groups[0]
+        assert independents.is_independent
+        for group in groups[1:] + [independents]:
+            for member in group.current_members + group.former_members:
+                (myear, chamber, number) = member.mp_ident
+                assert chamber == 2
+                mandate = mandate_lookup.find(member.mp_name, myear, number)
+                interval_list = mandate_intervals[mandate]
+
+                interval = member.get_interval()
+                if interval.start is None:
+                    interval = interval._replace(start=term_interval.lower)
+
+                if interval.end is None:
+                    interval = interval._replace(end=term_interval.upper)
+
+                if group.is_independent:
+                    if interval_list:
+                        start = interval_list[-1].end
+                        interval = interval._replace(start=start)
+
+                interval_list.append(interval)
+                interval_list.sort(key=lambda i: i[0])
 
-    mandate_lookup = models.MandateLookup()
-    mandate_intervals = defaultdict(list)
-    term_interval = TERM_INTERVAL[year]
-
-    groups = list(group_scraper.fetch(year))
-    independents = groups[0]
-    assert independents.is_independent
-    for group in groups[1:] + [independents]:
-        for member in group.current_members + group.former_members:
-            (myear, chamber, number) = member.mp_ident
-            assert chamber == 2
-            mandate = mandate_lookup.find(member.mp_name, myear, number)
-            interval_list = mandate_intervals[mandate]
-
-            interval = member.get_interval()
-            if interval.start is None:
-                interval = interval._replace(start=term_interval.lower)
-
-            if interval.end is None:
-                interval = interval._replace(end=term_interval.upper)
-
-            if group.is_independent:
-                if interval_list:
-                    start = interval_list[-1].end
-                    interval = interval._replace(start=start)
-
-            interval_list.append(interval)
-            interval_list.sort(key=lambda i: i[0])
-
-    for mandate, interval_list in mandate_intervals.items():
-        # make sure interval_list are continuous
-        new_intervals = []
-        for interval_one, interval_two in \
-            zip(interval_list[:-1], interval_list[1:]):
-
-            assert interval_one.start < interval_one.end
-            if interval_one.end < interval_two.start:
-                interval = Interval(
-                    start=interval_one.end,
-                    end=interval_two.start,
-                    group=independents,
-                )
-                new_intervals.append(interval)
-            elif interval_one.end > interval_two.start:
-                import pdb; pdb.set_trace()
-                raise RuntimeError("Overlapping intervals")
-
-        interval_list.extend(new_intervals)
-        interval_list.sort()
-
-        mandate_end = mandate.interval.upper
-        if mandate_end == date.max:
-            mandate_end = None
-        if interval_list[-1].end != mandate_end:
-            logger.warn("Mandate %s ends at %s",
-                        mandate, interval_list[-1].end)
-
-    group_patcher = TablePatcher(
-        models.MpGroup,
-        models.db.session,
-        key_columns=['short_name', 'year'],
-    )
-
-    with group_patcher.process(remove=True, filter={'year': year}) as add_group:
-        for group in groups:
-            record = group.as_dict(['name', 'short_name', 'year'])
-            group.row = add_group(record).row
+        for mandate, interval_list in mandate_intervals.items():
+            # make sure interval_list are continuous
+            new_intervals = []
+            for interval_one, interval_two in \
+                zip(interval_list[:-1], interval_list[1:]):
+
+                assert interval_one.start < interval_one.end
+                if interval_one.end < interval_two.start:
+                    interval = Interval(
+                        start=interval_one.end,
+                        end=interval_two.start,
+                        group=independents,
+                    )
+                    new_intervals.append(interval)
+                elif interval_one.end > interval_two.start:
+                    import pdb; pdb.set_trace()
+                    raise RuntimeError("Overlapping intervals")
+
+            interval_list.extend(new_intervals)
+            interval_list.sort()
+
+            mandate_end = mandate.interval.upper
+            if mandate_end == date.max:
+                mandate_end = None
+            if interval_list[-1].end != mandate_end:
+                logger.warn("Mandate %s ends at %s",
+                            mandate, interval_list[-1].end)
+
+        group_patcher = TablePatcher(
+            models.MpGroup,
+            models.db.session,
+            key_columns=['short_name', 'year'],
+        )
 
-        models.db.session.flush()
+        with group_patcher.process(remove=True, filter={'year': year}) as add_group:
+            for group in groups:
+                record = group.as_dict(['name', 'short_name', 'year'])
+                group.row = add_group(record).row
 
-    membership_patcher = TablePatcher(
-        models.MpGroupMembership,
-        models.db.session,
-        key_columns=['mandate_id', 'mp_group_id', 'interval'],
-    )
+            models.db.session.flush()
 
-    current_membership_query = (
-        models.db.session.query(models.MpGroupMembership.id)
-        .join(models.MpGroupMembership.mandate)
-        .filter_by(year=year)
-    )
-
-    remove_membership_ids = set(row.id for row in current_membership_query)
-    with membership_patcher.process(autoflush=1000) as add_membership:
-        for mandate, interval_list in mandate_intervals.items():
-            for interval in interval_list:
-                res = add_membership({
-                    'mandate_id': mandate.id,
-                    'mp_group_id': interval.group.row.id,
-                    'interval': DateRange(
-                        interval.start or date.min,
-                        interval.end or date.max,
-                    ),
-                })
-                if not res.is_new:
-                    remove_membership_ids.remove(res.row.id)
+        membership_patcher = TablePatcher(
+            models.MpGroupMembership,
+            models.db.session,
+            key_columns=['mandate_id', 'mp_group_id', 'interval'],
+        )
 
-    if remove_membership_ids:
-        unseen_items = (
-            models.MpGroupMembership.query
-            .filter(models.MpGroupMembership.id.in_(remove_membership_ids))
+        current_membership_query = (
+            models.db.session.query(models.MpGroupMembership.id)
+            .join(models.MpGroupMembership.mandate)
+            .filter_by(year=year)
         )
-        unseen_items.delete(synchronize_session=False)
-        logger.info("Deleted %d stale memberships", len(remove_membership_ids))
 
-    if no_commit:
-        logger.warn("Rolling back the transaction")
-        models.db.session.rollback()
+        remove_membership_ids = set(row.id for row in current_membership_query)
+        with membership_patcher.process(autoflush=1000) as add_membership:
+            for mandate, interval_list in mandate_intervals.items():
+                for interval in interval_list:
+                    res = add_membership({
+                        'mandate_id': mandate.id,
+                        'mp_group_id': interval.group.row.id,
+                        'interval': DateRange(
+                            interval.start or date.min,
+                            interval.end or date.max,
+                        ),
+                    })
+                    if not res.is_new:
+                        remove_membership_ids.remove(res.row.id)
+
+        if remove_membership_ids:
+            unseen_items = (
+                models.MpGroupMembership.query
+                .filter(models.MpGroupMembership.id.in_(remove_membership_ids))
+            )
+            unseen_items.delete(synchronize_session=False)
+            logger.info("Deleted %d stale memberships",
+                        len(remove_membership_ids))
 
-    else:
-        models.db.session.commit()
+        if no_commit:
+            logger.warn("Rolling back the transaction")
+            models.db.session.rollback()
+
+        else:
+            models.db.session.commit()
 
 
 @scraper_manager.command
@@ -383,218 +529,278 @@ def committees(
     cache_name=None,
     throttle=None,
     no_commit=False,
+    archive=False,
+    replay=False,
 ):
     from mptracker.scraper.committees import CommitteeScraper
 
     mandate_lookup = models.MandateLookup()
 
-    http_session = create_session(
-        cache_name=cache_name,
-        throttle=throttle and float(throttle),
-    )
+    with recorded_metrics('committees') as metrics:
+        http_session = create_session(
+            cache_name=cache_name,
+            throttle=throttle and float(throttle),
+            archive=archive,
+            replay=replay,
+            metrics=metrics,
+            documents=get_run_documents(),
+        )
 
-    scraper = CommitteeScraper(http_session)
+        scraper = CommitteeScraper(http_session)
 
-    committee_patcher = TablePatcher(
-        models.MpCommittee,
-        models.db.session,
-        key_columns=['chamber_id', 'cdep_id'],
-    )
+        committee_patcher = TablePatcher(
+            models.MpCommittee,
+            models.db.session,
+            key_columns=['chamber_id', 'cdep_id'],
+        )
 
-    membership_patcher = TablePatcher(
-        models.MpCommitteeMembership,
-        models.db.session,
-        key_columns=['mandate_id', 'mp_committee_id', 'interval'],
-    )
+        membership_patcher = TablePatcher(
+            models.MpCommitteeMembership,
+            models.db.session,
+            key_columns=['mandate_id', 'mp_committee_id', 'interval'],
+        )
 
-    with committee_patcher.process(remove=True) as add_committee, \
-         membership_patcher.process(remove=True) as add_membership:
-        for committee in scraper.fetch_committees():
-            res = add_committee(
-                committee.as_dict(['chamber_id', 'cdep_id', 'name']),
-            )
-            if res.is_new:
-                models.db.session.flush()
-            mp_committee = res.row
-
-            for member in committee.current_members + committee.former_members:
-                if member.end_date and member.end_date < TERM_2012_START:
-                    logger.warn(
-                        "Membership end date is before the 2012 "
-                        "term started, skipping: %r %r %r",
-                        member.mp_name, committee.name, member.end_date,
-                    )
-                    continue
-                interval = DateRange(
-                    member.start_date or TERM_2012_START,
-                    member.end_date or date.max,
-                )
-                if interval.lower > interval.upper:
-                    import pdb; pdb.set_trace()
-                mandate = mandate_lookup.find(
-                    member.mp_name,
-                    member.mp_ident.year,
-                    member.mp_ident.number,
+        with committee_patcher.process(remove=True) as add_committee, \
+             membership_patcher.process(remove=True) as add_membership:
+            for committee in scraper.fetch_committees():
+                res = add_committee(
+                    committee.as_dict(['chamber_id', 'cdep_id', 'name']),
                 )
-                add_membership({
-                    'role': member.role,
-                    'interval': interval,
-                    'mandate_id': mandate.id,
-                    'mp_committee_id': mp_committee.id,
-                })
+                if res.is_new:
+                    models.db.session.flush()
+                mp_committee = res.row
+
+                for member in (committee.current_members +
+                               committee.former_members):
+                    if member.end_date and member.end_date < TERM_2012_START:
+                        logger.warn(
+                            "Membership end date is before the 2012 "
+                            "term started, skipping: %r %r %r",
+                            member.mp_name, committee.name, member.end_date,
+                        )
+                        continue
+                    interval = DateRange(
+                        member.start_date or TERM_2012_START,
+                        member.end_date or date.max,
+                    )
+                    if interval.lower > interval.upper:
+                        import pdb; pdb.set_trace()
+                    mandate = mandate_lookup.find(
+                        member.mp_name,
+                        member.mp_ident.year,
+                        member.mp_ident.number,
+                    )
+                    add_membership({
+                        'role': member.role,
+                        'interval': interval,
+                        'mandate_id': mandate.id,
+                        'mp_committee_id': mp_committee.id,
+                    })
 
-    if no_commit:
-        logger.warn("Rolling back the transaction")
-        models.db.session.rollback()
+        if no_commit:
+            logger.warn("Rolling back the transaction")
+            models.db.session.rollback()
 
-    else:
-        models.db.session.commit()
+        else:
+            models.db.session.commit()
 
 
 @scraper_manager.command
-def committee_summaries(year=2014):
+def committee_summaries(year=2014, archive=False, replay=False):
     from mptracker.scraper.committee_summaries import SummaryScraper
 
     patcher = TablePatcher(models.CommitteeSummary,
                            models.db.session,
                            key_columns=['pdf_url'])
 
-    summary_scraper = SummaryScraper(get_cached_session(),
-                                     get_cached_session('question-pdf'))
-    records = summary_scraper.fetch_summaries(year, get_pdf_text=True)
+    with recorded_metrics('committee_summaries') as metrics:
+        summary_scraper = SummaryScraper(
+            get_cached_session(archive=archive, replay=replay, metrics=metrics,
+                               documents=get_run_documents()),
+            get_cached_session('question-pdf', archive=archive, replay=replay,
+                               metrics=metrics),
+        )
+        records = summary_scraper.fetch_summaries(year, get_pdf_text=True)
 
-    patcher.update(records)
+        patcher.update(records)
 
-    models.db.session.commit()
+        models.db.session.commit()
 
 
 @scraper_manager.command
 def proposals(
         cache_name=None,
         throttle=None,
+        concurrency=None,
+        revalidate=False,
+        archive=False,
+        replay=False,
         autoanalyze=False,
+        resume=False,
         ):
-    from mptracker.scraper.proposals import ProposalScraper
+    from mptracker.scraper.proposals import ProposalScraper, Proposal
     from mptracker.proposals import ocr_proposal
     from mptracker.policy import calculate_proposal
 
-    proposal_scraper = ProposalScraper(create_session(
-            cache_name=cache_name,
-            throttle=float(throttle) if throttle else None))
-
-    def cdep_id(mandate):
-        return (mandate.year, mandate.cdep_number)
-
-    by_cdep_id = {cdep_id(m): m
-                  for m in models.Mandate.query
-                  if m.year == 2012}
-
-    id_cdeppk_cdep = {}
-    id_cdeppk_senate = {}
-    for proposal in models.Proposal.query:
-        if proposal.cdeppk_cdep:
-            id_cdeppk_cdep[proposal.cdeppk_cdep] = proposal.id
-        if proposal.cdeppk_senate:
-            id_cdeppk_senate[proposal.cdeppk_senate] = proposal.id
-
-    chamber_by_slug = {c.slug: c for c in models.Chamber.query}
-
-    proposals = proposal_scraper.fetch_from_mp_pages(set(by_cdep_id.keys()))
-
-    all_activity = defaultdict(list)
-    for item in models.ProposalActivityItem.query:
-        all_activity[item.proposal_id].append(item)
-
-    proposal_patcher = TablePatcher(models.Proposal,
-                                    models.db.session,
-                                    key_columns=['id'])
-
-    activity_patcher = TablePatcher(models.ProposalActivityItem,
-                                    models.db.session,
-                                    key_columns=['id'])
-
-    sp_updates = sp_added = sp_removed = 0
-
-    changed = []
-    seen = []
-
-    with proposal_patcher.process(autoflush=1000, remove=True) as add_proposal:
-        with activity_patcher.process(autoflush=1000, remove=True) \
-                as add_activity:
-            for prop in proposals:
-                record = model_to_dict(prop, ['cdeppk_cdep', 'cdeppk_senate',
-                    'decision_chamber', 'url', 'title', 'date', 'number_bpi',
-                    'number_cdep', 'number_senate', 'proposal_type',
-                    'pdf_url', 'status', 'status_text'])
-
-                slug = prop.decision_chamber
-                if slug:
-                    record['decision_chamber'] = chamber_by_slug[slug]
-
-                idc = id_cdeppk_cdep.get(prop.cdeppk_cdep)
-                ids = id_cdeppk_senate.get(prop.cdeppk_senate)
-                if idc and ids and idc != ids:
-                    logger.warn("Two different records for the same proposal: "
-                                "(%s, %s). Removing the 2nd.", idc, ids)
-                    proposal_s = models.Proposal.query.get(ids)
-                    if proposal_s is not None:
-                        models.db.session.delete(proposal_s)
-                    ids = None
-                record['id'] = idc or ids or models.random_uuid()
-
-                result = add_proposal(record)
-                row = result.row
-                if result.is_changed:
-                    changed.append(row)
-                seen.append(row)
-
-                new_people = set(by_cdep_id[ci] for ci in prop.sponsorships)
-                existing_sponsorships = {sp.mandate: sp
-                                         for sp in row.sponsorships}
-                to_remove = set(existing_sponsorships) - set(new_people)
-                to_add = set(new_people) - set(existing_sponsorships)
-                if to_remove:
-                    logger.info("Removing sponsors %s: %r", row.id,
-                                [cdep_id(m) for m in to_remove])
-                    sp_removed += 1
-                    for m in to_remove:
-                        sp = existing_sponsorships[m]
-                        models.db.session.delete(sp)
-                if to_add:
-                    logger.info("Adding sponsors %s: %r", row.id,
-                                [cdep_id(m) for m in to_add])
-                    sp_added += 1
-                    for m in to_add:
-                        row.sponsorships.append(models.Sponsorship(mandate=m))
-
-                if to_remove or to_add:
-                    sp_updates += 1
-
-                db_activity = all_activity[row.id]
-                db_activity.sort(key=lambda a: a.order)
-                act_fields = lambda r: (r.date, r.location)
-                if ([act_fields(r) for r in db_activity] !=
-                    [act_fields(r) for r in prop.activity[:len(db_activity)]]):
-                    logger.warn("History doesn't match for %s, "
-                                "%d items will be removed",
-                                row.id,len(db_activity))
-                    db_activity = []
-
-                for n, ac in enumerate(prop.activity):
-                    record = model_to_dict(ac, ['date', 'location', 'html'])
-                    record['proposal_id'] = row.id
-                    record['order'] = n
-                    if n < len(db_activity):
-                        item = db_activity[n]
-                        record['id'] = item.id
-                        assert item.date == record['date']
-                        assert item.location == record['location']
-                        assert item.order == record['order']
-                    else:
-                        record['id'] = models.random_uuid()
-                    add_activity(record)
-
-    models.db.session.commit()
+    with recorded_metrics('proposals') as metrics:
+        proposal_scraper = ProposalScraper(create_session(
+                cache_name=cache_name,
+                throttle=float(throttle) if throttle else None,
+                concurrency=int(concurrency or 1),
+                revalidate=revalidate,
+                archive=archive,
+                replay=replay,
+                metrics=metrics,
+                documents=get_run_documents()))
+
+        def cdep_id(mandate):
+            return (mandate.year, mandate.cdep_number)
+
+        by_cdep_id = {cdep_id(m): m
+                      for m in models.Mandate.query
+                      if m.year == 2012}
+
+        journal = ProgressJournal('proposals', resume)
+        scraped = {}
+        for mandate_cdep_id in sorted(by_cdep_id):
+            key = '%d-%d' % mandate_cdep_id
+            if key in journal:
+                entry = journal.get(key)
+                for data in entry['new']:
+                    prop = Proposal.from_dict(data)
+                    scraped[prop.cdeppks] = prop
+                for cdeppks in entry['proposals']:
+                    prop = scraped[tuple(cdeppks)]
+                    prop.sponsorships.append(mandate_cdep_id)
+                continue
+            known = set(scraped)
+            mp_proposals = proposal_scraper.fetch_for_mp(mandate_cdep_id,
+                                                         scraped)
+            # details are recorded once, by the first MP who sponsors a
+            # proposal
+            new_proposals = []
+            for prop in mp_proposals:
+                if prop.cdeppks not in known:
+                    known.add(prop.cdeppks)
+                    new_proposals.append(prop.as_dict())
+            journal.record(key, {
+                'proposals': [list(prop.cdeppks) for prop in mp_proposals],
+                'new': new_proposals,
+            })
+            models.db.session.commit()
+        proposals = list(scraped.values())
+
+        id_cdeppk_cdep = {}
+        id_cdeppk_senate = {}
+        for proposal in models.Proposal.query:
+            if proposal.cdeppk_cdep:
+                id_cdeppk_cdep[proposal.cdeppk_cdep] = proposal.id
+            if proposal.cdeppk_senate:
+                id_cdeppk_senate[proposal.cdeppk_senate] = proposal.id
+
+        chamber_by_slug = {c.slug: c for c in models.Chamber.query}
+
+        all_activity = defaultdict(list)
+        for item in models.ProposalActivityItem.query:
+            all_activity[item.proposal_id].append(item)
+
+        proposal_patcher = TablePatcher(models.Proposal,
+                                        models.db.session,
+                                        key_columns=['id'])
+
+        activity_patcher = TablePatcher(models.ProposalActivityItem,
+                                        models.db.session,
+                                        key_columns=['id'])
+
+        sp_updates = sp_added = sp_removed = 0
+
+        changed = []
+        seen = []
+
+        with proposal_patcher.process(autoflush=1000, remove=True) \
+                as add_proposal:
+            with activity_patcher.process(autoflush=1000, remove=True) \
+                    as add_activity:
+                for prop in proposals:
+                    record = model_to_dict(prop, ['cdeppk_cdep',
+                        'cdeppk_senate', 'decision_chamber', 'url', 'title',
+                        'date', 'number_bpi', 'number_cdep', 'number_senate',
+                        'proposal_type', 'pdf_url', 'status', 'status_text'])
+
+                    slug = prop.decision_chamber
+                    if slug:
+                        record['decision_chamber'] = chamber_by_slug[slug]
+
+                    idc = id_cdeppk_cdep.get(prop.cdeppk_cdep)
+                    ids = id_cdeppk_senate.get(prop.cdeppk_senate)
+                    if idc and ids and idc != ids:
+                        logger.warn("Two different records for the same "
+                                    "proposal: (%s, %s). Removing the 2nd.",
+                                    idc, ids)
+                        proposal_s = models.Proposal.query.get(ids)
+                        if proposal_s is not None:
+                            models.db.session.delete(proposal_s)
+                        ids = None
+                    record['id'] = idc or ids or models.random_uuid()
+
+                    result = add_proposal(record)
+                    row = result.row
+                    if result.is_changed:
+                        changed.append(row)
+                    seen.append(row)
+
+                    new_people = set(by_cdep_id[ci]
+                                     for ci in prop.sponsorships)
+                    existing_sponsorships = {sp.mandate: sp
+                                             for sp in row.sponsorships}
+                    to_remove = set(existing_sponsorships) - set(new_people)
+                    to_add = set(new_people) - set(existing_sponsorships)
+                    if to_remove:
+                        logger.info("Removing sponsors %s: %r", row.id,
+                                    [cdep_id(m) for m in to_remove])
+                        sp_removed += 1
+                        for m in to_remove:
+                            sp = existing_sponsorships[m]
+                            models.db.session.delete(sp)
+                    if to_add:
+                        logger.info("Adding sponsors %s: %r", row.id,
+                                    [cdep_id(m) for m in to_add])
+                        sp_added += 1
+                        for m in to_add:
+                            row.sponsorships.append(
+                                models.Sponsorship(mandate=m))
+
+                    if to_remove or to_add:
+                        sp_updates += 1
+
+                    db_activity = all_activity[row.id]
+                    db_activity.sort(key=lambda a: a.order)
+                    act_fields = lambda r: (r.date, r.location)
+                    old_activity = prop.activity[:len(db_activity)]
+                    if ([act_fields(r) for r in db_activity] !=
+                        [act_fields(r) for r in old_activity]):
+                        logger.warn("History doesn't match for %s, "
+                                    "%d items will be removed",
+                                    row.id,len(db_activity))
+                        db_activity = []
+
+                    for n, ac in enumerate(prop.activity):
+                        record = model_to_dict(ac, ['date', 'location',
+                                                    'html'])
+                        record['proposal_id'] = row.id
+                        record['order'] = n
+                        if n < len(db_activity):
+                            item = db_activity[n]
+                            record['id'] = item.id
+                            assert item.date == record['date']
+                            assert item.location == record['location']
+                            assert item.order == record['order']
+                        else:
+                            record['id'] = models.random_uuid()
+                        add_activity(record)
+
+        journal.finish()
+        models.db.session.commit()
 
     logger.info("Updated sponsorship for %d proposals (+%d, -%d)",
                 sp_updates, sp_added, sp_removed)
@@ -611,72 +817,162 @@ def proposals(
                 calculate_proposal.delay(proposal.id)
 
 
-@scraper_manager.command
-def transcripts(start=None, n_sessions=1, cache_name=None, throttle=None):
-    from mptracker.scraper.transcripts import TranscriptScraper
-
-    if start is None:
-        max_serial = models.db.session.execute(
-            'select serial from transcript_chapter '
-            'order by serial desc limit 1').scalar()
-        start = int(max_serial.split('/')[0]) + 1
+EMPTY_SESSIONS = 'transcripts-empty'
 
-    cdeppk = int(start) - 1
-    n_sessions = int(n_sessions)
 
-    transcript_scraper = TranscriptScraper(
-            session=create_session(cache_name=cache_name,
-                                   throttle=throttle and float(throttle)))
+def get_empty_sessions(since):
+    """ Ids of sessions found without chapters on or after `since` """
+    query = models.ScraperCheckpoint.query.filter_by(command=EMPTY_SESSIONS)
+    return set(
+        int(row.key) for row in query
+        if parse_date(row.data['checked']) >= since
+    )
 
-    mandate_lookup = models.MandateLookup()
 
-    transcript_patcher = TablePatcher(models.Transcript,
-                                      models.db.session,
-                                      key_columns=['serial'])
-
-    with transcript_patcher.process() as add:
-        while n_sessions > 0:
-            n_sessions -= 1
-            cdeppk += 1
-            logger.info("Fetching session %s", cdeppk)
-            session_data = transcript_scraper.fetch_session(cdeppk)
-            if session_data is None:
-                logger.info("No content")
-                continue
-            for chapter in session_data.chapters:
-                chapter_row = (models.TranscriptChapter.query
-                                        .filter_by(serial=chapter.serial)
-                                        .first())
-                if chapter_row is None:
-                    chapter_row = models.TranscriptChapter(
-                        serial=chapter.serial)
-                    models.db.session.add(chapter_row)
-                    models.db.session.flush()
+def record_empty_session(cdeppk, empty):
+    """ Remember, or forget once it has chapters, that session `cdeppk`
+    has no chapters """
+    row = (
+        models.ScraperCheckpoint.query
+        .filter_by(command=EMPTY_SESSIONS, key=str(cdeppk))
+        .first()
+    )
+    if empty:
+        if row is None:
+            row = models.ScraperCheckpoint(command=EMPTY_SESSIONS,
+                                           key=str(cdeppk))
+            models.db.session.add(row)
+        row.data = {'checked': date.today().isoformat()}
+    elif row is not None:
+        models.db.session.delete(row)
+
+
+def find_missing_sessions(transcript_scraper, lookback, recheck_days=30):
+    """ Ids of sessions, up to the newest published one, that have no
+    chapters in the database, starting `lookback` ids before the newest
+    session we have. Ids found empty are skipped for `recheck_days`. """
+    serial = models.TranscriptChapter.serial
+    max_serial = (
+        models.db.session.query(serial)
+        .order_by(serial.desc())
+        .limit(1)
+        .scalar()
+    )
+    known = int(max_serial.split('/')[0])
+    newest = transcript_scraper.find_newest_session(known)
+    first = known - lookback + 1
+    have = set(
+        int(row[0].split('/')[0])
+        for row in (
+            models.db.session.query(serial)
+            .filter(serial >= '%05d/' % first)
+        )
+    )
+    have |= get_empty_sessions(date.today() - timedelta(days=recheck_days))
+    missing = [cdeppk for cdeppk in range(first, newest + 1)
+               if cdeppk not in have]
+    logger.info("Newest session is %d, we have up to %d, %d missing",
+                newest, known, len(missing))
+    return missing
 
-                chapter_row.date = session_data.date
-                chapter_row.headline = chapter.headline
 
-                for paragraph in chapter.paragraphs:
-                    if paragraph['mandate_chamber'] != 2:
-                        continue
-                    try:
-                        mandate = mandate_lookup.find(
-                                paragraph['speaker_name'],
-                                paragraph['mandate_year'],
-                                paragraph['mandate_number'])
-                    except models.LookupError as e:
-                        logger.warn("at %s %s", paragraph['serial'], e)
-                        continue
-
-                    transcript_data = {
-                        'chapter_id': chapter_row.id,
-                        'text': paragraph['text'],
-                        'serial': paragraph['serial'],
-                        'mandate_id': mandate.id,
-                    }
-                    add(transcript_data)
+@scraper_manager.command
+def transcripts(start=None, n_sessions=1, lookback=20, recheck_empty=30,
+                cache_name=None, throttle=None, archive=False, replay=False,
+                resume=False, workers=None):
+    from mptracker.scraper.transcripts import TranscriptScraper
 
-    models.db.session.commit()
+    journal = ProgressJournal('transcripts', resume)
+    workers = int(workers or 1)
+    with recorded_metrics('transcripts') as metrics:
+        transcript_scraper = TranscriptScraper(
+                session=create_session(cache_name=cache_name,
+                                       throttle=throttle and float(throttle),
+                                       concurrency=workers,
+                                       archive=archive,
+                                       replay=replay,
+                                       metrics=metrics,
+                                       documents=get_run_documents()))
+
+        run = journal.get('run')
+        if run is None:
+            if start is None:
+                sessions = find_missing_sessions(transcript_scraper,
+                                                 int(lookback),
+                                                 int(recheck_empty))
+            else:
+                sessions = list(range(int(start),
+                                      int(start) + int(n_sessions)))
+            run = {'sessions': sessions}
+            journal.record('run', run)
+
+        mandate_lookup = models.MandateLookup()
+
+        chapter_patcher = TablePatcher(models.TranscriptChapter,
+                                       models.db.session,
+                                       key_columns=['serial'])
+        transcript_patcher = TablePatcher(models.Transcript,
+                                          models.db.session,
+                                          key_columns=['serial'])
+
+        cdeppk_list = [
+            cdeppk for cdeppk in run['sessions']
+            if cdeppk not in journal
+        ]
+        session_iter = transcript_scraper.fetch_sessions(cdeppk_list, workers)
+
+        # chapters are streamed from the scraper; the rows of each chapter, and
+        # of each session's chapters, are looked up with a single query
+        with chapter_patcher.process() as add_chapter, \
+             transcript_patcher.process() as add:
+            for cdeppk, session_data in session_iter:
+                logger.info("Session %s", cdeppk)
+                empty = (session_data is None or
+                         not session_data.chapter_serials)
+                record_empty_session(cdeppk, empty)
+                if empty:
+                    logger.info("No content")
+                else:
+                    chapter_patcher.preload([
+                        {'serial': serial}
+                        for serial in session_data.chapter_serials
+                    ])
+                    for chapter in session_data.chapters:
+                        chapter_row = add_chapter({
+                            'serial': chapter.serial,
+                            'date': session_data.date,
+                            'headline': chapter.headline,
+                        }).row
+
+                        transcript_list = []
+                        for paragraph in chapter.paragraphs:
+                            if paragraph['mandate_chamber'] != 2:
+                                continue
+                            try:
+                                mandate = mandate_lookup.find(
+                                        paragraph['speaker_name'],
+                                        paragraph['mandate_year'],
+                                        paragraph['mandate_number'])
+                            except models.LookupError as e:
+                                logger.warn("at %s %s", paragraph['serial'], e)
+                                continue
+
+                            transcript_list.append({
+                                'chapter_id': chapter_row.id,
+                                'text': paragraph['text'],
+                                'serial': paragraph['serial'],
+                                'mandate_id': mandate.id,
+                            })
+
+                        transcript_patcher.preload(transcript_list)
+                        for transcript_data in transcript_list:
+                            add(transcript_data)
+
+                journal.record(cdeppk)
+                models.db.session.commit()
+
+        journal.finish()
+        models.db.session.commit()
 
 
 @scraper_manager.command
@@ -764,85 +1060,146 @@ def votes(
         days=1,
         cache_name=None,
         throttle=None,
+        concurrency=None,
+        revalidate=False,
+        archive=False,
+        replay=False,
         no_commit=False,
         autoanalyze=False,
+        resume=False,
+        every_day=False,
         ):
-    from mptracker.scraper.votes import VoteScraper
-
-    if start is None:
-        start = models.db.session.execute(
-            'select date from voting_session '
-            'order by date desc limit 1').scalar() + ONE_DAY
-
-    else:
-        start = parse_date(start)
-
-    days = int(days)
-
-    http_session = create_session(cache_name=cache_name,
-                                  throttle=throttle and float(throttle))
-    vote_scraper = VoteScraper(http_session)
-
-
-    voting_session_patcher = TablePatcher(
-        models.VotingSession,
-        models.db.session,
-        key_columns=['cdeppk'],
-    )
-
-    vote_patcher = TablePatcher(
-        models.Vote,
-        models.db.session,
-        key_columns=['voting_session_id', 'mandate_id'],
-    )
+    from mptracker.scraper.votes import VoteScraper, SittingCalendar
+
+    journal = ProgressJournal('votes', resume)
+    run = journal.get('run')
+    if run is None:
+        if start is None:
+            start = models.db.session.execute(
+                'select date from voting_session '
+                'order by date desc limit 1').scalar() + ONE_DAY
+
+        else:
+            start = parse_date(start)
+
+        run = {'start': start.isoformat(), 'days': int(days)}
+        journal.record('run', run)
+
+    start = parse_date(run['start'])
+    days = run['days']
+
+    with recorded_metrics('votes') as metrics:
+        http_session = create_session(cache_name=cache_name,
+                                      throttle=throttle and float(throttle),
+                                      concurrency=int(concurrency or 1),
+                                      revalidate=revalidate,
+                                      archive=archive,
+                                      replay=replay,
+                                      metrics=metrics,
+                                      documents=get_run_documents())
+        vote_scraper = VoteScraper(http_session)
+
+        if every_day:
+            sitting_calendar = None
+        else:
+            chapter = models.TranscriptChapter
+            chapters = models.db.session.query(chapter.serial, chapter.date)
+            # the session before `start` tells whether coverage is contiguous
+            # up to the first day
+            previous = (
+                chapters
+                .filter(chapter.date < start)
+                .order_by(chapter.serial.desc())
+                .limit(1)
+            )
+            sitting_calendar = SittingCalendar(
+                ((int(serial.split('/')[0]), chapter_date)
+                 for (serial, chapter_date) in
+                 list(previous) +
+                 list(chapters.filter(chapter.date >= start))),
+                PARLIAMENT_VACATIONS,
+            )
+        n_skipped = 0
 
-    proposal_ids = {p.cdeppk_cdep: p.id for p in models.Proposal.query}
-    mandate_lookup = models.MandateLookup()
+        voting_session_patcher = TablePatcher(
+            models.VotingSession,
+            models.db.session,
+            key_columns=['cdeppk'],
+        )
 
-    new_voting_session_list = []
+        vote_patcher = TablePatcher(
+            models.Vote,
+            models.db.session,
+            key_columns=['voting_session_id', 'mandate_id'],
+        )
 
-    with voting_session_patcher.process() as add_voting_session:
-        with vote_patcher.process() as add_vote:
-            for delta in range(days):
-                the_date = start + ONE_DAY * delta
-                if the_date >= date.today():
-                    # don't scrape today, maybe voting is not done yet!
-                    break
-                logger.info("Scraping votes from %s", the_date)
-                for voting_session in vote_scraper.scrape_day(the_date):
-                    record = model_to_dict(
-                        voting_session,
-                        ['cdeppk', 'subject', 'subject_html'],
-                    )
-                    record['date'] = the_date
-                    proposal_cdeppk = voting_session.proposal_cdeppk
-                    record['proposal_id'] = (proposal_ids.get(proposal_cdeppk)
-                                             if proposal_cdeppk else None)
-                    record['final'] = bool("vot final" in
-                                           record['subject'].lower())
-                    vs = add_voting_session(record).row
-                    if vs.id is None:
-                        models.db.session.flush()
+        proposal_ids = {p.cdeppk_cdep: p.id for p in models.Proposal.query}
+        mandate_lookup = models.MandateLookup()
 
-                    new_voting_session_list.append(vs.id)
+        new_voting_session_list = []
 
-                    for vote in voting_session.votes:
-                        record = model_to_dict(vote, ['choice'])
-                        record['voting_session_id'] = vs.id
-                        mandate = mandate_lookup.find(
-                            vote.mandate_name,
-                            vote.mandate_year,
-                            vote.mandate_number,
+        with voting_session_patcher.process() as add_voting_session:
+            with vote_patcher.process() as add_vote:
+                for delta in range(days):
+                    the_date = start + ONE_DAY * delta
+                    if the_date >= date.today():
+                        # don't scrape today, maybe voting is not done yet!
+                        break
+                    if the_date in journal:
+                        new_voting_session_list.extend(journal.get(the_date))
+                        continue
+                    if not (sitting_calendar is None or
+                            sitting_calendar.may_have_votes(the_date)):
+                        if the_date.weekday() < 5:
+                            logger.info("Skipping %s, no sitting", the_date)
+                        n_skipped += 1
+                        continue
+                    day_voting_session_list = []
+                    logger.info("Scraping votes from %s", the_date)
+                    for voting_session in vote_scraper.scrape_day(the_date):
+                        record = model_to_dict(
+                            voting_session,
+                            ['cdeppk', 'subject', 'subject_html'],
                         )
-                        record['mandate_id'] = mandate.id
-                        add_vote(record)
-
-    if no_commit:
-        logger.warn("Rolling back the transaction")
-        models.db.session.rollback()
-
-    else:
-        models.db.session.commit()
+                        record['date'] = the_date
+                        proposal_cdeppk = voting_session.proposal_cdeppk
+                        record['proposal_id'] = (
+                            proposal_ids.get(proposal_cdeppk)
+                            if proposal_cdeppk else None)
+                        record['final'] = bool("vot final" in
+                                               record['subject'].lower())
+                        vs = add_voting_session(record).row
+                        if vs.id is None:
+                            models.db.session.flush()
+
+                        day_voting_session_list.append(vs.id)
+
+                        for vote in voting_session.votes:
+                            record = model_to_dict(vote, ['choice'])
+                            record['voting_session_id'] = vs.id
+                            mandate = mandate_lookup.find(
+                                vote.mandate_name,
+                                vote.mandate_year,
+                                vote.mandate_number,
+                            )
+                            record['mandate_id'] = mandate.id
+                            add_vote(record)
+
+                    new_voting_session_list.extend(day_voting_session_list)
+                    if not no_commit:
+                        journal.record(the_date, day_voting_session_list)
+                        models.db.session.commit()
+
+        if n_skipped:
+            logger.info("Skipped %d days without a sitting", n_skipped)
+
+        if no_commit:
+            logger.warn("Rolling back the transaction")
+            models.db.session.rollback()
+
+        else:
+            journal.finish()
+            models.db.session.commit()
 
     if autoanalyze:
         from mptracker.votes import calculate_voting_session_loyalty
@@ -1156,9 +1513,24 @@ def assets(file_path, no_commit=False):
 
 
 @scraper_manager.command
-def auto(cache_name=None):
-    transcripts(n_sessions=20, cache_name=cache_name)
-    questions(autoanalyze=True, cache_name=cache_name)
-    votes(days=20, autoanalyze=True, cache_name=cache_name)
-    groups(cache_name=cache_name)
-    proposals(autoanalyze=True, cache_name=cache_name)
+def auto(cache_name=None, throttle=None, concurrency=None, revalidate=False,
+         archive=False, replay=False, resume=False):
+    transcripts(cache_name=cache_name, throttle=throttle,
+                workers=concurrency, archive=archive, replay=replay,
+                resume=resume)
+    questions(year='%d-%d' % (TERM_2012_START.year, date.today().year),
+              autoanalyze=True, cache_name=cache_name, throttle=throttle,
+              concurrency=concurrency, revalidate=revalidate,
+              archive=archive, replay=replay)
+    votes(days=20, autoanalyze=True, cache_name=cache_name, throttle=throttle,
+          concurrency=concurrency, revalidate=revalidate,
+          archive=archive, replay=replay, resume=resume)
+    groups(cache_name=cache_name, throttle=throttle,
+           archive=archive, replay=replay)
+    proposals(autoanalyze=True, cache_name=cache_name, throttle=throttle,
+              concurrency=concurrency, revalidate=revalidate,
+              archive=archive, replay=replay, resume=resume)
+
+    documents = get_run_documents()
+    logger.info("Parsed pages: %d fetched, %d reused",
+                documents.misses, documents.hits)
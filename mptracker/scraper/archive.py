@@ -0,0 +1,119 @@
+import os
+import gzip
+import json
+import tempfile
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+
+class PageArchive:
+    """ Page bodies are gzipped and named after their SHA-1, so a page that
+    didn't change is stored only once. An SQLite index records which
+    content was fetched from each URL, and when. """
+
+    def __init__(self, root):
+        self.root = root
+        self.objects = root / 'objects'
+        self.objects.makedirs_p()
+        self.db = sqlite3.connect(root / 'index.sqlite',
+                                  check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.db:
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS page ('
+                'url TEXT NOT NULL, fetched TEXT NOT NULL, '
+                'status INTEGER NOT NULL, headers TEXT NOT NULL, '
+                'sha1 TEXT NOT NULL)'
+            )
+            self.db.execute(
+                'CREATE INDEX IF NOT EXISTS page_url ON page (url)')
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute(
+                'SELECT COUNT(DISTINCT url) FROM page').fetchone()[0]
+
+    def object_path(self, sha1):
+        return self.objects / sha1[:2] / (sha1[2:] + '.gz')
+
+    def latest(self, url):
+        with self.lock:
+            return self.db.execute(
+                'SELECT status, headers, sha1 FROM page WHERE url = ? '
+                'ORDER BY rowid DESC LIMIT 1', (url,)).fetchone()
+
+    def save(self, url, status, headers, content):
+        sha1 = hashlib.sha1(content).hexdigest()
+        object_path = self.object_path(sha1)
+        if not object_path.isfile():
+            object_path.parent.makedirs_p()
+            # another thread may be saving the same content
+            (fd, tmp_path) = tempfile.mkstemp(suffix='.tmp',
+                                              dir=object_path.parent)
+            with os.fdopen(fd, 'wb') as raw, \
+                    gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                f.write(content)
+            os.replace(tmp_path, object_path)
+
+        latest = self.latest(url)
+        if latest is not None and latest[0] == status and latest[2] == sha1:
+            return
+        with self.lock, self.db:
+            self.db.execute(
+                'INSERT INTO page VALUES (?, ?, ?, ?, ?)',
+                (url, datetime.utcnow().isoformat(), status,
+                 json.dumps(dict(headers)), sha1))
+
+    def load(self, url):
+        """ The status, headers and content last archived for `url`, or
+        `None` """
+        latest = self.latest(url)
+        if latest is None:
+            return None
+        (status, headers, sha1) = latest
+        with gzip.open(self.object_path(sha1), 'rb') as f:
+            content = f.read()
+        return (status, json.loads(headers), content)
+
+
+def create_archive_hook(archive):
+    def hook(response, **extra):
+        if response.status_code != 304:
+            archive.save(response.url, response.status_code,
+                         response.headers, response.content)
+        return response
+    return hook
+
+
+class ReplayAdapter(BaseAdapter):
+    """ Serves requests exclusively from the archive, without touching the
+    network """
+
+    def __init__(self, archive):
+        super().__init__()
+        self.archive = archive
+
+    def send(self, request, **kwargs):
+        found = self.archive.load(request.url)
+        if found is None:
+            raise requests.ConnectionError(
+                "%s is not in the page archive" % request.url)
+        (status, headers, content) = found
+        response = requests.Response()
+        response.status_code = status
+        response.url = request.url
+        response.request = request
+        response.headers = CaseInsensitiveDict(headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = content
+        response.from_cache = True
+        return response
+
+    def close(self):
+        pass
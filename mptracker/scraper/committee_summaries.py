@@ -5,7 +5,8 @@ from urllib.parse import urlparse, parse_qs
 from pyquery import PyQuery as pq
 from flask import json
 from path import path
-from mptracker.scraper.common import (Scraper, pqitems, get_cached_session)
+from mptracker.scraper.common import (Scraper, pqitems, get_cached_session,
+                                      find_anchors, enclosing_table)
 
 
 with (path(__file__).parent / 'committee_names.json').open('rb') as f:
@@ -36,8 +37,8 @@ class SummaryScraper(Scraper):
         for p in range(50):
             page_url = self.listing_page_url.format(offset=100*p, year=year)
             page = self.fetch_url(page_url)
-            i_el = list(pqitems(page, ":contains('înregistrări')"))[-1]
-            table = list(i_el.parents('table'))[-1]
+            i_el = find_anchors(page, 'înregistrări')[-1]
+            table = enclosing_table(i_el)
             empty_page = True
             table_rows = pqitems(pq(table), 'tr')
             assert "înregistrări găsite:" in next(table_rows).text()
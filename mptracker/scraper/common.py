@@ -1,13 +1,22 @@
 import time
-from datetime import date, timedelta
-from urllib.parse import urlencode, urlparse, parse_qs
+import json
+import sqlite3
+import threading
+from bisect import bisect
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from urllib.parse import urlencode, urljoin, urlparse, parse_qs
 import logging
 import re
 import csv
 import io
-from collections import namedtuple
+from collections import namedtuple, OrderedDict, defaultdict, deque
 from path import path
+import flask
 import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
 from werkzeug.urls import url_decode, url_parse
 from pyquery import PyQuery as pq
 from lxml.html.clean import clean_html
@@ -30,21 +39,27 @@ class Scraper(object):
 
     use_cdep_opener = True
 
+    # links that are made absolute after parsing, as {tag: attribute}
+    absolute_links = {'a': 'href'}
+
     def __init__(self, session=None):
         self.session = session or requests.Session()
 
-    def opener(self, url):
-        # we need to pass in all the hooks because of a bug in requests 2.0.0
-        # https://github.com/kennethreitz/requests/issues/1655
-        resp = self.session.get(url, hooks=self.session.hooks)
+    def parse_page(self, content, url):
         if self.use_cdep_opener:
-            text = resp.content.decode('iso-8859-2')
-            # we use utf-16 because the parser's autodetect works fine with it
-            return text.encode('utf-16')
+            # cdep.ro's charset declaration is malformed, so the parser
+            # needs to be told the encoding
+            parser = HTMLParser(encoding='iso-8859-2')
+            root = fromstring(content, base_url=url, parser=parser)
         else:
-            return resp.text
-
-    def fetch_url(self, url, args=None):
+            root = fromstring(content, base_url=url)
+        make_links_absolute(root, url, self.absolute_links)
+        return pq(root)
+
+    def fetch_url(self, url, args=None, cache=True):
+        """ With `cache=False`, the page is neither looked up in nor added to
+        the session's document cache; use it for pages that no other
+        scraper will ask for. """
         if args:
             if '?' not in url:
                 url += '?'
@@ -52,10 +67,104 @@ class Scraper(object):
                 url += '&'
             url += urlencode(args)
         logger.debug("Fetching URL %s", url)
-        page = pq(url, parser='html', opener=self.opener)
-        page.make_links_absolute()
+
+        documents = getattr(self.session, 'documents', None) if cache else None
+        key = (url, self.use_cdep_opener)
+        if documents is not None:
+            page = documents.get(key)
+            if page is not None:
+                return page
+
+        # we need to pass in all the hooks because of a bug in requests 2.0.0
+        # https://github.com/kennethreitz/requests/issues/1655
+        resp = self.session.get(url, hooks=self.session.hooks)
+        if self.use_cdep_opener:
+            page = self.parse_page(resp.content, url)
+        else:
+            page = self.parse_page(resp.text, url)
+
+        if documents is not None:
+            documents.put(key, page,
+                          len(resp.content) * PARSED_PAGE_SIZE_RATIO)
         return page
 
+    def fetch_many(self, urls, cache=True):
+        """ Fetch pages concurrently, as many at a time as the session
+        allows, and yield them in the order of `urls`. At most
+        `2 * concurrency` pages are fetched ahead of the caller. """
+        concurrency = getattr(self.session, 'concurrency', 1)
+        if concurrency <= 1:
+            for url in urls:
+                yield self.fetch_url(url, cache=cache)
+            return
+        with ThreadPoolExecutor(concurrency) as executor:
+            pending = deque()
+            try:
+                for url in urls:
+                    pending.append(
+                        executor.submit(self.fetch_url, url, cache=cache))
+                    if len(pending) >= 2 * concurrency:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+
+            finally:
+                for future in pending:
+                    future.cancel()
+
+
+def make_links_absolute(root, base_url, links):
+    for tag, attribute in links.items():
+        for element in root.iter(tag):
+            value = element.get(attribute)
+            if value is None:
+                continue
+            if value.startswith(('tel:', 'callto:', 'sms:')):
+                continue
+            element.set(attribute, urljoin(base_url, value.strip()))
+
+
+# a parsed page takes up about this many times the size of its HTML,
+# measured on the pages in testsuite/pages
+PARSED_PAGE_SIZE_RATIO = 13
+
+
+class DocumentCache:
+    """ Pages parsed during a scraper run, so that each page is downloaded
+    and parsed only once, whichever scraper asks for it. When the pages add
+    up to more than `max_bytes`, the least recently used ones are dropped.
+    Scrapers must not modify the pages they get from here. """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.documents = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.documents)
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.documents:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.documents.move_to_end(key)
+            return self.documents[key][0]
+
+    def put(self, key, document, size):
+        with self.lock:
+            if key in self.documents:
+                self.size -= self.documents.pop(key)[1]
+            self.documents[key] = (document, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                (_, (_, old_size)) = self.documents.popitem(last=False)
+                self.size -= old_size
+
 
 class GenericModel:
 
@@ -76,8 +185,261 @@ def create_throttle(seconds):
     return hook
 
 
-def create_session(cache_name=None, throttle=None, counters=False):
-    if cache_name:
+class TokenBucket:
+    """ Allows `rate` requests per second on average, in bursts of at most
+    `capacity` requests. Callers reserve a token and wait only until their
+    turn comes, so concurrent requests are spread evenly. """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            elapsed = now - self.updated
+            self.tokens = min(self.capacity,
+                              self.tokens + elapsed * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class HostThrottle:
+    """ A separate token bucket for each host """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.rate, self.capacity)
+            bucket = self.buckets[host]
+        return bucket.acquire()
+
+
+class ThrottledAdapter(HTTPAdapter):
+    """ Waits for the throttle before sending each request over the
+    network; responses served from the cache never get here. The time
+    spent waiting is saved as `response.throttle_wait`. """
+
+    def __init__(self, throttle, **kwargs):
+        self.throttle = throttle
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        wait = 0
+        if self.throttle is not None:
+            wait = self.throttle.acquire(request.url)
+        response = super().send(request, **kwargs)
+        response.throttle_wait = wait
+        return response
+
+
+# upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = [.05, .1, .25, .5, 1, 2.5, 5, 10, 30]
+
+
+def get_endpoint(url):
+    """ The last segment of the URL path, e.g. `evot.nominal` """
+    parsed = urlparse(url)
+    return parsed.path.rstrip('/').rsplit('/', 1)[-1] or parsed.netloc
+
+
+class HttpMetrics:
+    """ Requests, cache hits, bytes, download time, latency histogram and
+    throttle wait time, for each endpoint """
+
+    def __init__(self):
+        self.endpoints = defaultdict(self.empty_endpoint)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def empty_endpoint():
+        return {
+            'requests': 0,
+            'cache_hits': 0,
+            'bytes': 0,
+            'download_time': 0.0,
+            'throttle_wait': 0.0,
+            'latency_histogram': [0] * (len(LATENCY_BUCKETS) + 1),
+        }
+
+    def record_response(self, response):
+        # `elapsed` is measured by the session, so it includes the throttle
+        wait = getattr(response, 'throttle_wait', 0)
+        seconds = max(0, response.elapsed.total_seconds() - wait)
+        cache_hit = (response.status_code == 304 or
+                     getattr(response, 'from_cache', False))
+        with self.lock:
+            data = self.endpoints[get_endpoint(response.url)]
+            data['requests'] += 1
+            data['cache_hits'] += int(bool(cache_hit))
+            data['bytes'] += len(response.content)
+            data['download_time'] += seconds
+            data['throttle_wait'] += wait
+            data['latency_histogram'][bisect(LATENCY_BUCKETS, seconds)] += 1
+
+    def total(self):
+        rv = self.empty_endpoint()
+        with self.lock:
+            for data in self.endpoints.values():
+                for key, value in data.items():
+                    if key == 'latency_histogram':
+                        rv[key] = [a + b for a, b in zip(rv[key], value)]
+                    else:
+                        rv[key] += value
+        return rv
+
+    def as_json(self):
+        def with_ratio(data):
+            rv = dict(data)
+            rv['cache_hit_ratio'] = (data['cache_hits'] / data['requests']
+                                     if data['requests'] else None)
+            return rv
+
+        with self.lock:
+            endpoints = {name: with_ratio(data)
+                         for name, data in self.endpoints.items()}
+        return {
+            'latency_buckets': LATENCY_BUCKETS,
+            'endpoints': endpoints,
+            'total': with_ratio(self.total()),
+        }
+
+
+class ValidatorStore:
+    """ The last response for each URL that came with an `ETag` or
+    `Last-Modified` header, in an SQLite file """
+
+    def __init__(self, db_path):
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.db:
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS page ('
+                'url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, '
+                'headers TEXT, content BLOB)'
+            )
+
+    def get(self, url):
+        with self.lock:
+            row = self.db.execute(
+                'SELECT etag, last_modified, headers, content '
+                'FROM page WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return None
+        (etag, last_modified, headers, content) = row
+        return {
+            'etag': etag,
+            'last_modified': last_modified,
+            'headers': json.loads(headers),
+            'content': bytes(content),
+        }
+
+    def save(self, url, response):
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not (etag or last_modified):
+            return
+        with self.lock, self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO page VALUES (?, ?, ?, ?, ?)',
+                (url, etag, last_modified, json.dumps(dict(response.headers)),
+                 response.content))
+
+
+class RevalidatingSession(requests.Session):
+    """ Asks the server whether a page changed since it was last
+    downloaded, with a conditional GET, and serves the stored copy if the
+    answer is `304 Not Modified`. `response` hooks see the 304 response,
+    and the functions in `not_modified_hooks` the stored copy that
+    replaces it. """
+
+    def __init__(self, db_path):
+        super().__init__()
+        self.store = ValidatorStore(db_path)
+        self.not_modified_hooks = []
+
+    def send(self, request, **kwargs):
+        if request.method != 'GET':
+            return super().send(request, **kwargs)
+
+        cached = self.store.get(request.url)
+        if cached is not None:
+            if cached['etag']:
+                request.headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                request.headers['If-Modified-Since'] = cached['last_modified']
+
+        response = super().send(request, **kwargs)
+
+        if response.status_code == 304 and cached is not None:
+            response = self.cached_response(cached, response)
+            for hook in self.not_modified_hooks:
+                response = hook(response)
+            return response
+        if response.status_code == 200:
+            self.store.save(request.url, response)
+        return response
+
+    def cached_response(self, cached, not_modified):
+        response = requests.Response()
+        response.status_code = 200
+        response.url = not_modified.url
+        response.request = not_modified.request
+        response.elapsed = not_modified.elapsed
+        response.headers = CaseInsensitiveDict(cached['headers'])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = cached['content']
+        response.from_cache = True
+        return response
+
+
+def get_page_archive():
+    from mptracker.scraper.archive import PageArchive
+    root = flask.current_app.config.get('MPTRACKER_PAGE_ARCHIVE')
+    if root is None:
+        return PageArchive(PROJECT_ROOT / '_data' / 'archive')
+    return PageArchive(path(root))
+
+
+def create_session(cache_name=None, throttle=None, metrics=None,
+                   concurrency=1, revalidate=False, archive=False,
+                   replay=False, documents=None):
+    """ `throttle` is the number of seconds between two requests to the
+    same host, and `concurrency` the number of requests that may be in
+    flight at the same time. With `revalidate`, cached pages are checked
+    with a conditional GET instead of being served as they are.
+
+    With `archive`, all pages are saved to the page archive; with `replay`
+    they are served exclusively from it. Scrapers look up parsed pages in
+    `documents`, a `DocumentCache`, before fetching them. Every response
+    is recorded in `metrics`, if given, an `HttpMetrics`. """
+    if replay:
+        from mptracker.scraper.archive import ReplayAdapter
+        session = requests.Session()
+        session.concurrency = concurrency
+        adapter = ReplayAdapter(get_page_archive())
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+    elif cache_name and revalidate:
+        cache_file = cache_name + '-validators.sqlite'
+        session = RevalidatingSession(PROJECT_ROOT / '_data' / cache_file)
+
+    elif cache_name:
         import requests_cache
         cache_path = PROJECT_ROOT / '_data' / cache_name
         session = requests_cache.CachedSession(cache_path)
@@ -85,29 +447,38 @@ def create_session(cache_name=None, throttle=None, counters=False):
     else:
         session = requests.Session()
 
-    if counters:
-        session.counters = counters_data = {
-            'requests': 0,
-            'bytes': 0,
-            'download_time': timedelta(),
-        }
+    session.documents = documents
 
-        def request_count_hook(response, **extra):
-            counters_data['requests'] += 1
-            counters_data['bytes'] += len(response.content)
-            counters_data['download_time'] += response.elapsed
+    if not replay:
+        session.concurrency = concurrency
+        adapter = ThrottledAdapter(
+            HostThrottle(1 / throttle) if throttle else None,
+            pool_connections=10,
+            pool_maxsize=concurrency,
+            pool_block=True,
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+    if metrics is not None:
+        def metrics_hook(response, **extra):
+            metrics.record_response(response)
             return response
 
-        session.hooks['response'].append(request_count_hook)
+        session.hooks['response'].append(metrics_hook)
 
-    if throttle:
-        session.hooks['response'].append(create_throttle(throttle))
+    if archive and not replay:
+        from mptracker.scraper.archive import create_archive_hook
+        archive_hook = create_archive_hook(get_page_archive())
+        session.hooks['response'].append(archive_hook)
+        if isinstance(session, RevalidatingSession):
+            session.not_modified_hooks.append(archive_hook)
 
     return session
 
 
-def get_cached_session(name='page-cache'):
-    return create_session(name)
+def get_cached_session(name='page-cache', **kwargs):
+    return create_session(name, **kwargs)
 
 
 def pqitems(ob, selector=None):
@@ -119,6 +490,28 @@ def pqitems(ob, selector=None):
     return [cls(el) for el in found]
 
 
+# Same matches as pyquery's `:contains()`, which compiles the selector on
+# every call and tests the first text node of every element: here only
+# the text nodes that contain `$text` are tested for being first.
+ANCHOR_XPATH = etree.XPath(
+    'descendant::text()[contains(., $text)]'
+    '[count(. | ../text()[1]) = 1]/..')
+
+ENCLOSING_TABLE_XPATH = etree.XPath('ancestor::table[1]')
+
+
+def find_anchors(page, text):
+    """ Elements whose first text node contains `text`, in document
+    order """
+    return [el for root in page for el in ANCHOR_XPATH(root, text=text)]
+
+
+def enclosing_table(element):
+    """ The innermost table around `element` """
+    [table] = ENCLOSING_TABLE_XPATH(element)
+    return table
+
+
 def get_cdep_id(href, fail='raise'):
     qs = parse_qs(urlparse(href).query)
     if qs.get('cam') != ['2']:
@@ -229,33 +622,62 @@ def parse_interval(start_txt, end_txt):
     return DateRange(start_date, end_date)
 
 
-class TableRow:
+def element_text(element):
+    """ The text of an lxml element, joined together like pyquery's `text()`
+    does, without wrapping the element in a PyQuery object """
+    chunks = []
+
+    def add_text(el):
+        if el.text and not isinstance(el, etree._Comment):
+            chunks.append(el.text)
+        for child in el:
+            add_text(child)
+            if child.tail:
+                chunks.append(child.tail)
+
+    add_text(element)
+    return ' '.join(t.strip() for t in chunks if t.strip())
 
-    def __init__(self, headings, tdpq, up_text_values):
-        self.headings = headings
-        self.tdpq = tdpq
-        self.text_values = [td.text() for td in self.tdpq.items()]
-        self.text_or_up_values = [
-            t or ut for t, ut in
-            zip(self.text_values, up_text_values)
-        ]
 
-    def _find_column(self, text):
-        for n, col_text in enumerate(self.headings):
-            if text in col_text:
-                return n
+class TableRow:
+    """ Cell text is only extracted when asked for, then remembered """
+
+    def __init__(self, table, cells, up):
+        self.table = table
+        self.cells = cells
+        self.up = up
+        self.text_values = {}
+        self.inherited_values = {}
+
+    def _text(self, col):
+        if col not in self.text_values:
+            self.text_values[col] = element_text(self.cells[col])
+        return self.text_values[col]
+
+    def _inherited_text(self, col):
+        # walk up to the closest row that knows its inherited value, then
+        # fill in the values on the way back down
+        pending = []
+        row = self
+        while row is not None and col not in row.inherited_values:
+            pending.append(row)
+            row = row.up
+        value = "" if row is None else row.inherited_values[col]
+        for row in reversed(pending):
+            value = row._text(col) or value
+            row.inherited_values[col] = value
+        return value
 
     def td(self, header_text):
-        col = self._find_column(header_text)
+        col = self.table.column(header_text)
         assert col is not None, "No column named %r" % header_text
-        return self.tdpq.eq(col)
+        return pq(self.cells[col])
 
     def text(self, header_text, inherit=False):
-        col = self._find_column(header_text)
+        col = self.table.column(header_text)
         if col is None:
             return ""
-        values = self.text_or_up_values if inherit else self.text_values
-        return values[col]
+        return self._inherited_text(col) if inherit else self._text(col)
 
 
 class TableParser:
@@ -263,6 +685,7 @@ class TableParser:
     def __init__(self, table_html, double_header=False):
         self.table = pq(table_html)
         self.double_header = double_header
+        self.columns = {}
         if double_header:
             self.headings = []
             skip_row2_cell = []
@@ -283,20 +706,28 @@ class TableParser:
                 self.table.children('tr').eq(0).children().items()
             ]
 
+    def column(self, header_text):
+        """ Index of the first column whose heading contains `header_text`,
+        or `None` """
+        if header_text not in self.columns:
+            self.columns[header_text] = next(
+                (n for n, col_text in enumerate(self.headings)
+                 if header_text in col_text),
+                None,
+            )
+        return self.columns[header_text]
+
     def __iter__(self):
-        tr_iter = iter(self.table.children('tr').items())
+        tr_list = [tr for table in self.table
+                      for tr in table.iterchildren('tr')]
+        tr_iter = iter(tr_list)
         next(tr_iter)
         if self.double_header:
             next(tr_iter)
-        up_text_values = [""] * len(self.headings)
+        row = None
         for tr in tr_iter:
-            table_row = TableRow(
-                self.headings,
-                tr.children('td'),
-                up_text_values,
-            )
-            up_text_values = table_row.text_or_up_values
-            yield table_row
+            row = TableRow(self, list(tr.iterchildren('td')), row)
+            yield row
 
 
 class MembershipParser:
@@ -32,13 +32,16 @@ class MandateScraper(Scraper):
 
         has_start_date = bool('Membru din' in row_list[0].text())
 
-        for row in row_list[2:]:
+        rows = row_list[2:]
+        person_pages = self.fetch_many(
+            row.children().eq(1).find('a').attr('href') for row in rows)
+
+        for (row, person_page) in zip(rows, person_pages):
             cols = row.children()
             link = cols.eq(1).find('a')
             (year, chamber, number) = parse_profile_url(link.attr('href'))
 
             last_first = link.text()
-            person_page = self.fetch_url(link.attr('href'))
             picture = person_page.find('a.highslide')
             first_last = (
                 person_page.find('.headline').html()
@@ -2,10 +2,12 @@ import re
 import logging
 from datetime import date, datetime
 import itertools
+from copy import deepcopy
 from pyquery import PyQuery as pq
 from werkzeug.urls import url_decode
-from mptracker.scraper.common import Scraper, pqitems, get_cdep_id, sanitize
-from mptracker.common import fix_local_chars
+from mptracker.scraper.common import (Scraper, pqitems, get_cdep_id, sanitize,
+                                      find_anchors, enclosing_table)
+from mptracker.common import fix_local_chars, parse_date
 
 
 logger = logging.getLogger(__name__)
@@ -14,11 +16,39 @@ logger.setLevel(logging.INFO)
 
 class Proposal:
 
+    detail_fields = ['title', 'number_bpi', 'number_cdep', 'number_senate',
+                     'proposal_type', 'decision_chamber', 'pdf_url',
+                     'status', 'status_text']
+
     def __init__(self, cdeppk_cdep, cdeppk_senate):
         self.cdeppk_cdep = cdeppk_cdep
         self.cdeppk_senate = cdeppk_senate
         self.sponsorships = []
 
+    def as_dict(self):
+        """ The scraped details, without sponsorships, as JSON data """
+        rv = {k: getattr(self, k, None) for k in self.detail_fields}
+        rv['cdeppks'] = list(self.cdeppks)
+        rv['date'] = self.date.isoformat()
+        rv['activity'] = [
+            {'date': ac.date.isoformat(), 'location': ac.location,
+             'html': ac.html}
+            for ac in self.activity
+        ]
+        return rv
+
+    @classmethod
+    def from_dict(cls, data):
+        prop = cls(*data['cdeppks'])
+        for k in cls.detail_fields:
+            setattr(prop, k, data[k])
+        prop.date = parse_date(data['date'])
+        prop.activity = [
+            Activity(parse_date(ac['date']), ac['location'], ac['html'])
+            for ac in data['activity']
+        ]
+        return prop
+
     @property
     def cdeppks(self):
         return (self.cdeppk_cdep, self.cdeppk_senate)
@@ -77,23 +107,32 @@ class ProposalScraper(Scraper):
     def fetch_from_mp_pages(self, mandate_cdep_id_list):
         proposals = {}
         for mandate_cdep_id in mandate_cdep_id_list:
-            for prop in self.fetch_mp_proposals(mandate_cdep_id):
-                if prop.cdeppks in proposals:
-                    prop = proposals[prop.cdeppks]
-                else:
-                    self.fetch_proposal_details(prop)
-                    proposals[prop.cdeppks] = prop
-                prop.sponsorships.append(mandate_cdep_id)
+            self.fetch_for_mp(mandate_cdep_id, proposals)
         return list(proposals.values())
 
+    def fetch_for_mp(self, mandate_cdep_id, proposals):
+        """ Add the MP's proposals to `proposals`, a dict indexed by
+        `cdeppks`, fetching details only for the new ones. Returns the MP's
+        proposals. """
+        rv = []
+        for prop in self.fetch_mp_proposals(mandate_cdep_id):
+            if prop.cdeppks in proposals:
+                prop = proposals[prop.cdeppks]
+            else:
+                self.fetch_proposal_details(prop)
+                proposals[prop.cdeppks] = prop
+            prop.sponsorships.append(mandate_cdep_id)
+            rv.append(prop)
+        return rv
+
     def fetch_mp_proposals(self, cdep_id):
         (leg, idm) = cdep_id
         url = self.mandate_proposal_url.format(leg=leg, idm=idm)
         page = self.fetch_url(url)
-        headline = pqitems(page, ':contains("PL înregistrat la")')
+        headline = find_anchors(page, "PL înregistrat la")
         if not headline:
             return  # no proposals here
-        table = pq(headline[0].parents('table')[-1])
+        table = pq(enclosing_table(headline[0]))
         rows = iter(pqitems(table, 'tr'))
         assert "PL înregistrat la" in next(rows).text()
         assert "Camera Deputaţilor" in next(rows).text()
@@ -116,12 +155,10 @@ class ProposalScraper(Scraper):
             return 'inprogress'
 
     def fetch_proposal_details(self, prop):
-        page = self.fetch_url(prop.url)
-        page_cdep = page_senate = None
-        if prop.url_cdep:
-            page_cdep = self.fetch_url(prop.url_cdep)
-        if prop.url_senate:
-            page_senate = self.fetch_url(prop.url_senate)
+        url_list = [url for url in [prop.url_cdep, prop.url_senate] if url]
+        pages = list(self.fetch_many(url_list))
+        page_cdep = pages.pop(0) if prop.url_cdep else None
+        page_senate = pages.pop(0) if prop.url_senate else None
 
         page = page_cdep or page_senate
 
@@ -134,8 +171,8 @@ class ProposalScraper(Scraper):
         prop.status = None
         prop.status_text = None
 
-        [hook_td] = pqitems(page, ':contains("Nr. înregistrare")')
-        metadata_table = pq(hook_td.parents('table')[-1])
+        [hook_td] = find_anchors(page, "Nr. înregistrare")
+        metadata_table = pq(enclosing_table(hook_td))
         for row in pqitems(metadata_table.children('tr')):
             cols = row.children()
             label = cols.eq(0).text().strip()
@@ -188,8 +225,8 @@ class ProposalScraper(Scraper):
 
     def get_activity(self, page):
         activity = []
-        headline = page.find(':contains("Derularea procedurii legislative")')
-        table = list(headline.parents('table').items())[-1]
+        headline = find_anchors(page, "Derularea procedurii legislative")[-1]
+        table = pq(enclosing_table(headline))
 
         date = None
         seen_data = False
@@ -226,6 +263,9 @@ class ProposalScraper(Scraper):
                 location = last_col.text()
 
             else:
+                # the page may be shared through the document cache, so
+                # don't modify it
+                last_col = pq(deepcopy(cols[-1]))
                 last_col.find('img[src="/img/spacer.gif"]').remove()
                 (last_col.find('img[src="/img/icon_pdf_small.gif"]')
                     .replaceWith('(pdf)'))
@@ -2,6 +2,7 @@
 
 import sys
 import re
+import hashlib
 from datetime import datetime
 import logging
 from path import path
@@ -22,6 +23,9 @@ with open(path(__file__).parent / 'question_exceptions.json') as f:
 
 class QuestionScraper(Scraper):
 
+    index_url = ('http://www.cdep.ro/pls/parlam/'
+                 'interpelari.lista?tip=&dat={year}&idl=1')
+
     title_pattern = re.compile(r'^(?P<type>Întrebarea|Interpelarea) '
                                r'(adresată .*)?'
                                r'nr\.')
@@ -49,7 +53,9 @@ class QuestionScraper(Scraper):
                 return (link.text(), year, number)
 
     def get_question(self, href):
-        page = self.fetch_url(href)
+        return self.parse_question(href, self.fetch_url(href, cache=False))
+
+    def parse_question(self, href, page):
         heading = page('#pageHeader .pageHeaderLinks').text()
         heading_m = self.title_pattern.match(heading)
         assert heading_m is not None, "Could not parse heading %r" % heading
@@ -68,6 +74,8 @@ class QuestionScraper(Scraper):
         question['method'] = None
         question['person'] = []
 
+        question['answered'] = False
+
         label_text = None
 
         for row in rows:
@@ -75,6 +83,9 @@ class QuestionScraper(Scraper):
             if norm_text == '':
                 continue
             elif norm_text == 'Informaţii privind răspunsul':
+                # the answer's text is linked from its section, once
+                # there is one
+                question['answered'] = any(pqitems(tr, 'a') for tr in rows)
                 break
 
             [label, value] = [pq(el) for el in row[0]]
@@ -108,18 +119,34 @@ class QuestionScraper(Scraper):
         question.update(patch)
         return question
 
-    def run(self, year):
-        index = self.fetch_url('http://www.cdep.ro/pls/parlam/'
-                               'interpelari.lista?tip=&dat={year}&idl=1'
-                               .format(year=year))
+    def index_rows(self, index):
+        """ `(href, digest)` for each question in the index; the digest
+        changes when anything in the question's row does """
         for link in pqitems(index, '#pageContent table a'):
             href = link.attr('href')
             if href in url_skip:
                 continue
             assert href.startswith('http://www.cdep.ro/pls/'
                                    'parlam/interpelari.detalii')
-
-            if self.skip(href):
-                logger.debug('skipping %r', href)
-            else:
-                yield self.get_question(href)
+            row_text = self.normalize_space(link.closest('tr').text())
+            digest = hashlib.sha1((href + '\n' + row_text).encode('utf-8'))
+            yield (href, digest.hexdigest())
+
+    def run(self, *years):
+        index_url_list = [self.index_url.format(year=year) for year in years]
+        href_list = []
+        index_digest = {}
+        for index in self.fetch_many(index_url_list):
+            for href, digest in self.index_rows(index):
+                if self.skip(href, digest):
+                    logger.debug('skipping %r', href)
+                else:
+                    href_list.append(href)
+                    index_digest[href] = digest
+
+        logger.info("Fetching %d questions", len(href_list))
+        pages = self.fetch_many(href_list, cache=False)
+        for href, page in zip(href_list, pages):
+            question = self.parse_question(href, page)
+            question['index_digest'] = index_digest[href]
+            yield question
@@ -1,15 +1,19 @@
 """ Fetch and parse transcripts """
 
 from datetime import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse, parse_qs
 from pyquery import PyQuery as pq
 from mptracker.scraper.common import (Scraper, pqitems, get_cached_session,
-                                      parse_profile_url, open_scraper_resource)
+                                      parse_profile_url, open_scraper_resource,
+                                      find_anchors)
 
 
 class Session:
 
-    def __init__(self):
+    def __init__(self, cdeppk):
+        self.cdeppk = cdeppk
         self.chapters = []
 
 
@@ -35,8 +39,8 @@ class TranscriptScraper(Scraper):
         super().__init__(*args, **kwargs)
 
     def get_session_date(self, page):
-        td = page.find(':contains("Sunteţi în secţiunea")')
-        date_str = td.parent().text().split()[-1]
+        [td] = find_anchors(page, "Sunteţi în secţiunea")
+        date_str = pq(td.getparent()).text().split()[-1]
         if date_str == '>':
             return None
         return datetime.strptime(date_str, '%d-%m-%Y').date()
@@ -45,8 +49,7 @@ class TranscriptScraper(Scraper):
         for link_el in page('td.headlinetext1 b a'):
             link = link_el.attrib['href']
             plink = urlparse(link)
-            assert plink.path == '/pls/steno/steno.stenograma', \
-                    "%s -> %s" % (self.cdeppk, link)
+            assert plink.path == '/pls/steno/steno.stenograma', link
             if ',' in parse_qs(plink.query)['idm'][0]:
                 # this is a fragment page. we can ignore it since we
                 # already have the content from the parent page.
@@ -56,12 +59,8 @@ class TranscriptScraper(Scraper):
             headline = pq(headline_el).text()
             yield link, headline
 
-    def get_chapter_serial(self):
-        return '%05d/%02d' % (self.session_cdeppk, self.chapter_serial)
-
-    def next_paragraph_serial(self):
-        self.paragraph_serial += 1
-        return self.get_chapter_serial() + '-%03d' % self.paragraph_serial
+    def get_chapter_serial(self, session_cdeppk, chapter_number):
+        return '%05d/%02d' % (session_cdeppk, chapter_number)
 
     def trim_name(self, name):
         name = name.replace(' (din sală)', '')
@@ -71,11 +70,12 @@ class TranscriptScraper(Scraper):
         else:
             return name
 
-    def parse_transcript_page(self, link):
-        page = self.fetch_url(link)
+    def parse_transcript_page(self, page, chapter_serial):
         table_rows = pqitems(page, '#pageContent > table tr')
         transcript = None
         transcript_chapter = Chapter()
+        transcript_chapter.serial = chapter_serial
+        paragraph_number = 0
 
         def save_paragraph():
             text = "\n".join(transcript.pop('text_buffer'))
@@ -89,7 +89,8 @@ class TranscriptScraper(Scraper):
                     if speakers:
                         if transcript:
                             save_paragraph()
-                        serial = self.next_paragraph_serial()
+                        paragraph_number += 1
+                        serial = chapter_serial + '-%03d' % paragraph_number
                         assert len(speakers) == 1
                         speaker_name = self.trim_name(speakers.text())
                         link = speakers.parents('a')
@@ -118,19 +119,87 @@ class TranscriptScraper(Scraper):
 
         return transcript_chapter
 
-    def fetch_session(self, cdeppk):
-        self.session_cdeppk = cdeppk
-        self.chapter_serial = 0
-        transcript_session = Session()
-        session_page = self.fetch_url(self.session_url % self.session_cdeppk)
+    def iter_chapters(self, chapter_list, serials):
+        # chapter pages are read once, so they would only crowd the cache
+        pages = self.fetch_many([link for link, headline in chapter_list],
+                                cache=False)
+        for (link, headline), serial, page in zip(chapter_list, serials,
+                                                  pages):
+            transcript_chapter = self.parse_transcript_page(page, serial)
+            transcript_chapter.headline = headline
+            yield transcript_chapter
+
+    def fetch_session(self, cdeppk, stream=False):
+        """ With `stream`, the session's `chapters` are fetched and parsed
+        one at a time, as they are iterated over """
+        transcript_session = Session(cdeppk)
+        session_page = self.fetch_url(self.session_url % cdeppk)
         transcript_session.date = self.get_session_date(session_page)
         if transcript_session.date is None:
             return None
-        for link, headline in self.chapters_for_session(session_page):
-            self.chapter_serial += 1
-            self.paragraph_serial = 0
-            transcript_chapter = self.parse_transcript_page(link)
-            transcript_chapter.headline = headline
-            transcript_chapter.serial = self.get_chapter_serial()
-            transcript_session.chapters.append(transcript_chapter)
+        chapter_list = list(self.chapters_for_session(session_page))
+        transcript_session.chapter_serials = [
+            self.get_chapter_serial(cdeppk, n + 1)
+            for n in range(len(chapter_list))
+        ]
+        chapters = self.iter_chapters(chapter_list,
+                                      transcript_session.chapter_serials)
+        transcript_session.chapters = chapters if stream else list(chapters)
         return transcript_session
+
+    def find_newest_session(self, known, probe_width=3):
+        """ Id of the newest published session, found by probing ever
+        further ids after `known`, a published one, and then bisecting.
+        A short run of empty ids, less than `probe_width`, is not taken
+        for the end. """
+        published = {}
+
+        def is_published(cdeppk):
+            if cdeppk not in published:
+                page = self.fetch_url(self.session_url % cdeppk)
+                published[cdeppk] = self.get_session_date(page) is not None
+            return published[cdeppk]
+
+        def published_from(cdeppk):
+            return any(is_published(cdeppk + n) for n in range(probe_width))
+
+        (low, step) = (known, 1)
+        while published_from(known + step):
+            low = known + step
+            step *= 2
+        high = known + step
+        while high - low > 1:
+            middle = (low + high) // 2
+            if published_from(middle):
+                low = middle
+            else:
+                high = middle
+        return low
+
+    def fetch_sessions(self, cdeppk_list, workers=1):
+        """ Yield `(cdeppk, session)` for each of `cdeppk_list`, in order.
+        With one worker, chapters are streamed. With several `workers`,
+        the next sessions are fetched and parsed in parallel while the
+        caller processes the current one, up to `2 * workers` sessions
+        ahead. """
+        if workers <= 1:
+            for cdeppk in cdeppk_list:
+                yield (cdeppk, self.fetch_session(cdeppk, stream=True))
+            return
+
+        with ThreadPoolExecutor(workers) as executor:
+            pending = deque()
+            try:
+                for cdeppk in cdeppk_list:
+                    future = executor.submit(self.fetch_session, cdeppk)
+                    pending.append((cdeppk, future))
+                    if len(pending) >= 2 * workers:
+                        (cdeppk, future) = pending.popleft()
+                        yield (cdeppk, future.result())
+                while pending:
+                    (cdeppk, future) = pending.popleft()
+                    yield (cdeppk, future.result())
+
+            finally:
+                for (cdeppk, future) in pending:
+                    future.cancel()
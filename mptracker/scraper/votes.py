@@ -1,7 +1,8 @@
 import logging
 from pyquery import PyQuery as pq
 from mptracker.scraper.common import (Scraper, GenericModel, url_args,
-                                      parse_profile_url)
+                                      parse_profile_url, find_anchors,
+                                      enclosing_table)
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -28,6 +29,34 @@ def parse_choice(text):
         raise RuntimeError("Unknown vote choice %r" % text)
 
 
+class SittingCalendar:
+    """ Days on which the chamber may have voted, given the transcript
+    `sessions` we have, as `(cdeppk, date)` pairs. Between two sessions with
+    consecutive ids, only the days of those sessions; elsewhere, because
+    a transcript may be missing, any weekday outside of `vacations`. """
+
+    def __init__(self, sessions, vacations=[]):
+        session_date = {}
+        for (cdeppk, day) in sessions:
+            session_date[cdeppk] = min(day, session_date.get(cdeppk, day))
+        self.sitting_days = set(session_date.values())
+        ordered = sorted(session_date.items())
+        self.covered = [
+            (d0, d1) for ((k0, d0), (k1, d1)) in zip(ordered, ordered[1:])
+            if k1 == k0 + 1
+        ]
+        self.vacations = vacations
+
+    def may_have_votes(self, day):
+        if day in self.sitting_days:
+            return True
+        if any(d0 <= day <= d1 for d0, d1 in self.covered):
+            return False
+        if day.weekday() >= 5:
+            return False
+        return not any(d0 <= day < d1 for d0, d1 in self.vacations)
+
+
 class VoteScraper(Scraper):
 
     DAY_URL = 'http://www.cdep.ro/pls/steno/evot.data?dat=%s'
@@ -35,20 +64,27 @@ class VoteScraper(Scraper):
 
     def scrape_day(self, day):
         url = self.DAY_URL % day.strftime('%Y%m%d')
-        page = self.fetch_url(url)
+        page = self.fetch_url(url, cache=False)
         table = page.find('#pageContent table')
+        vote_cdeppk_list = []
         for link in table.items('td:nth-child(1) a'):
             href = link.attr('href')
             assert href.startswith('http://www.cdep.ro/pls/'
                                    'steno/evot.nominal?idv=')
-            vote_cdeppk = url_args(href).get('idv', type=int)
-            yield self.scrape_vote(vote_cdeppk)
+            vote_cdeppk_list.append(url_args(href).get('idv', type=int))
+
+        url_list = [self.VOTE_URL % cdeppk for cdeppk in vote_cdeppk_list]
+        pages = self.fetch_many(url_list, cache=False)
+        for vote_cdeppk, vote_page in zip(vote_cdeppk_list, pages):
+            yield self.parse_vote(vote_cdeppk, vote_page)
 
     def scrape_vote(self, vote_cdeppk):
         url = self.VOTE_URL % vote_cdeppk
-        page = self.fetch_url(url)
-        subject_label = list(page.items(':contains("Subiect vot:")'))[0]
-        subject_td = list(subject_label.parent().items('td'))[1]
+        return self.parse_vote(vote_cdeppk, self.fetch_url(url, cache=False))
+
+    def parse_vote(self, vote_cdeppk, page):
+        subject_label = find_anchors(page, "Subiect vot:")[0]
+        subject_td = list(pq(subject_label.getparent()).items('td'))[1]
         voting_session = VotingSession(
             cdeppk=vote_cdeppk,
             subject=subject_td.text(),
@@ -64,8 +100,8 @@ class VoteScraper(Scraper):
                 args = url_args(href)
                 voting_session.proposal_cdeppk = args.get('idp', type=int)
 
-        td_nr_crt = page.find(':contains("Nr. Crt.")')
-        table = pq(td_nr_crt.parents().filter('table')[-1])
+        td_nr_crt = find_anchors(page, "Nr. Crt.")[-1]
+        table = pq(enclosing_table(td_nr_crt))
         role_call = bool(voting_session.subject.startswith('Prezenţă'))
         for row in list(table.items('tr'))[1:]:
             link = row.find('a')
@@ -0,0 +1,95 @@
+import logging
+from itertools import islice
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from flask.ext.script import Manager
+from mptracker import models
+from mptracker.nlp import (match_in_pool, get_match_targets,
+                           get_target_fingerprints, match_fingerprint)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+transcripts_manager = Manager()
+
+
+@transcripts_manager.command
+def analyze_all(number=None, force=False, minority_only=False,
+                processes=None, stale=False):
+    """ Match the speeches of all MPs against the place names of their
+    county, streaming them through a pool of worker processes """
+    mandate_query = (
+        models.Mandate.query
+        .options(joinedload('person'), joinedload('county'))
+    )
+    targets = get_match_targets(mandate_query, minority_only)
+
+    transcript_ids = None
+    if stale:
+        transcript_ids = find_stale_transcripts(targets)
+        logger.info("found %d stale matches", len(transcript_ids))
+
+    text_query = (
+        models.db.session.query(
+            models.Transcript.id,
+            models.Transcript.mandate_id,
+            models.Transcript.text,
+        )
+        .filter(models.Transcript.text != None)
+        .filter(models.Transcript.mandate_id.in_(list(targets)))
+    )
+    if transcript_ids is not None:
+        text_query = text_query.filter(
+            models.Transcript.id.in_(transcript_ids))
+    elif not force:
+        text_query = (
+            text_query
+            .outerjoin(models.Match, models.Match.id == models.Transcript.id)
+            .filter(models.Match.id == None)
+        )
+    # speeches of the same mandate end up in the same batches
+    text_query = text_query.order_by(models.Transcript.mandate_id)
+
+    connection = models.db.engine.connect()
+    rows = (connection.execution_options(stream_results=True)
+                      .execute(text_query.statement))
+    documents = ((text, [(transcript_id, mandate_id)])
+                 for transcript_id, mandate_id, text in rows)
+    if number:
+        documents = islice(documents, int(number))
+
+    n_done = 0
+    try:
+        batches = match_in_pool(documents, targets,
+                                processes and int(processes),
+                                batch_size=1000)
+        for results in batches:
+            models.Match.save_batch('transcript', results)
+            models.db.session.commit()
+            n_done += len(results)
+            logger.info("analyzed %d speeches", n_done)
+    finally:
+        connection.close()
+
+
+def find_stale_transcripts(targets):
+    """ Ids of speeches whose match is missing, or was computed from
+    another vocabulary, MP details or text than the current ones. """
+    mandate_fingerprints = get_target_fingerprints(targets)
+    query = (
+        models.db.session.query(
+            models.Transcript.id,
+            models.Transcript.mandate_id,
+            func.md5(models.Transcript.text),
+            models.Match.fingerprint,
+        )
+        .outerjoin(models.Match, models.Match.id == models.Transcript.id)
+        .filter(models.Transcript.text != None)
+        .filter(models.Transcript.mandate_id.in_(list(targets)))
+    )
+    return [
+        transcript_id
+        for transcript_id, mandate_id, text_fp, fingerprint in query
+        if fingerprint != match_fingerprint(mandate_fingerprints[mandate_id],
+                                            text_fp)
+    ]
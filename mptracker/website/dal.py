@@ -3,6 +3,7 @@ from collections import defaultdict
 from sqlalchemy import func, distinct
 from sqlalchemy.orm import joinedload, aliased
 from jinja2 import filters
+from mptracker.common import PARLIAMENT_VACATIONS
 from mptracker.models import (
     Chamber,
     County,
@@ -136,6 +137,14 @@ class DalPerson:
             .filter(Match.score > 0)
         )
 
+    @property
+    def _local_transcript_query(self):
+        return (
+            self.mandate.transcripts
+            .join(Transcript.match_row)
+            .filter(Match.score > 0)
+        )
+
     def get_details(self):
         rv = self.get_main_details()
         rv.update({
@@ -286,6 +295,7 @@ class DalPerson:
         rv['questions'] = self.mandate.asked.count()
         rv['proposals'] = self.mandate.sponsorships.count()
         rv['local_score'] = self._local_ask_query.count()
+        rv['local_speeches'] = self._local_transcript_query.count()
         return rv
 
     def get_assets_data(self):
@@ -370,12 +380,6 @@ class DalPerson:
     def get_activitychart_data(self):
         days = [date(2012, 12, 17) + timedelta(weeks=w) for w in range(52 * 4)]
 
-        vacations = [
-            (date(2012, 12, 24), date(2013, 1, 21)),
-            (date(2013, 7, 1), date(2013, 9, 2)),
-            (date(2013, 12, 30), date(2014, 2, 3)),
-        ]
-
         proposals_by_day = group_by_week(
             db.session.query(
                 Proposal.date,
@@ -404,7 +408,8 @@ class DalPerson:
                 'date': day,
                 'proposals': proposals_by_day.get(day, 0),
                 'questions': questions_by_day.get(day, 0),
-                'vacation': any(d0 <= day < d1 for d0, d1 in vacations),
+                'vacation': any(d0 <= day < d1
+                                for d0, d1 in PARLIAMENT_VACATIONS),
             })
 
         return series
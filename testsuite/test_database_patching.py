@@ -98,3 +98,15 @@ def test_patcher_add_returns_row(patcher):
     row1 = patcher.add({'code': 'an', 'name': "Anne"}).row
     row2 = patcher.add({'code': 'an', 'name': "Annette"}).row
     assert row1 == row2
+
+
+def test_preloaded_records_are_updated_and_created(patcher_twin_key):
+    records = [{'code': 'an', 'number': 1, 'name': "Anne"},
+               {'code': 'bo', 'number': 2, 'name': "Bob"}]
+    patcher_twin_key.update(records[:1])
+    records[0]['name'] = "Annette"
+    patcher_twin_key.preload(records)
+    with patcher_twin_key.process() as add:
+        results = [add(record) for record in records]
+    assert [r.is_new for r in results] == [False, True]
+    assert sorted([t.name for t in Thing.query]) == ["Annette", "Bob"]
@@ -1,4 +1,4 @@
-from mptracker.nlp import match_names
+from mptracker.nlp import match_names, NameMatcher, MultiMatcher, CountyIndex
 
 
 def test_match_string_in_text():
@@ -60,3 +60,99 @@ def test_match_stemmed_name():
     text = "azi Argeșenele se revoltă"
     match = match_names(text, ['Argeș'], [])
     assert [m['name'] for m in match] == ['Argeș']
+
+
+def test_matcher_is_reusable():
+    matcher = NameMatcher(['Sinaia', 'Cluj-Napoca'], ['memoriu'])
+    match_one = matcher.match("azi la Sinaia un memoriu")
+    match_two = matcher.match("ieri la Cluj-Napoca")
+    assert [m['name'] for m in match_one] == ['Sinaia', 'memoriu']
+    assert [m['name'] for m in match_two] == ['Cluj-Napoca']
+
+
+def test_multi_matcher_matches_each_target_separately():
+    matcher = MultiMatcher({
+        'ph': ['Prahova', 'Sinaia'],
+        'cj': ['Cluj', 'Sinaia'],
+    }, [])
+    text = ("Domnul VIRGIL GURAN, Deputat PNL Prahova, Obiectul întrebării "
+            "drumul dintre Sinaia și Cluj")
+    matches = matcher.match_targets(text, [
+        (1, 'ph', {'name': "Guran Virgil", 'county_name': "Prahova"}),
+        (2, 'cj', {'name': "Pop Ion", 'county_name': "Cluj"}),
+    ])
+    assert [m['name'] for m in matches[1]] == ['Sinaia']
+    assert [m['name'] for m in matches[2]] == ['Sinaia', 'Cluj']
+
+
+def test_county_index_counts_mentions_per_county():
+    index = CountyIndex([
+        {'code': 29, 'name': "Prahova", 'place_names': ["Prahova", "Sinaia"]},
+        {'code': 12, 'name': "Cluj", 'place_names': ["Cluj", "Cluj-Napoca"]},
+    ])
+    text = ("Domnul VIRGIL GURAN, Deputat PNL Prahova, Obiectul întrebării "
+            "drumul dintre Sinaia, Cluj-Napoca și Prahova")
+    assert index.count_mentions(text) == {29: 2, 12: 1}
+
+
+def test_fuzzy_match_tolerates_ocr_errors():
+    text = "drumul spre Cluj-Napoea și Sinala"
+    assert match_names(text, ['Cluj-Napoca', 'Sinaia'], []) == []
+    match = match_names(text, ['Cluj-Napoca', 'Sinaia'], [], max_distance=2)
+    assert [m['name'] for m in match] == ['Cluj-Napoca', 'Sinaia']
+    assert [m['token'].text for m in match] == ['Cluj Napoea', 'Sinala']
+    assert all(0 < m['distance'] < 1 for m in match)
+
+
+def test_fuzzy_match_ignores_short_words():
+    match = match_names("azi la Clui", ['Cluj'], [], max_distance=2)
+    assert match == []
+
+
+def test_compiled_vocabulary_is_ignored_when_phrases_change(tmpdir,
+                                                             monkeypatch):
+    import pickle
+    from path import path
+    from mptracker import nlp
+    data_path = path(str(tmpdir))
+    monkeypatch.setattr(nlp, 'get_placename_data_path', lambda: data_path)
+    compiled = {
+        'version': MultiMatcher.VERSION,
+        'source': [],
+        'phrase_lists': nlp.get_phrase_lists_fingerprint(),
+        'matcher': None,
+        'county_index': None,
+    }
+    with (data_path / nlp.COMPILED_VOCABULARY_NAME).open('wb') as f:
+        pickle.dump(compiled, f)
+
+    nlp.load_compiled_vocabulary.cache_clear()
+    assert nlp.load_compiled_vocabulary() is not None
+
+    monkeypatch.setattr(nlp, 'other_phrases', nlp.other_phrases + ['foo'])
+    nlp.load_compiled_vocabulary.cache_clear()
+    assert nlp.load_compiled_vocabulary() is None
+    nlp.load_compiled_vocabulary.cache_clear()
+
+
+def test_target_fingerprints_match_the_matchers(monkeypatch):
+    from mptracker import nlp
+    vocabularies = {'a': ['Cluj', 'Turda'], 'b': ['Iaşi']}
+    monkeypatch.setattr(nlp, 'get_vocabulary', vocabularies.get)
+    monkeypatch.setattr(nlp, 'get_max_distance', lambda: 0)
+    targets = {
+        'm1': ('a', {'name': "Ion Popescu"}),
+        'm2': ('b', {'name': "Ion Popescu"}),
+    }
+    expected = {
+        mandate_id: nlp.mandate_fingerprint(
+            NameMatcher(vocabularies[key], nlp.other_phrases).fingerprint,
+            mp_info)
+        for mandate_id, (key, mp_info) in targets.items()
+    }
+
+    def no_matcher(*args, **kwargs):
+        raise AssertionError("should not build a matcher")
+
+    monkeypatch.setattr(nlp, 'NameMatcher', no_matcher)
+    assert nlp.get_target_fingerprints(targets) == expected
@@ -0,0 +1,72 @@
+import pytest
+import flask
+import requests
+from path import path
+
+URL = 'http://www.cdep.ro/pls/steno/steno.sumar?ids=7277'
+
+
+@pytest.fixture
+def data_dir(request, tmpdir, monkeypatch):
+    from mptracker.scraper import common
+    root = path(str(tmpdir))
+    (root / '_data').makedirs_p()
+    monkeypatch.setattr(common, 'PROJECT_ROOT', root)
+    app = flask.Flask('__main__')
+    app.config['MPTRACKER_PAGE_ARCHIVE'] = root / 'archive'
+    ctx = app.app_context()
+    ctx.push()
+    request.addfinalizer(ctx.pop)
+    return root
+
+
+def stub_session(adapter, **kwargs):
+    from mptracker.scraper.common import create_session
+    session = create_session(**kwargs)
+    session.mount('http://', adapter)
+    return session
+
+
+def test_replay_serves_archived_pages(data_dir, stub_adapter):
+    from mptracker.scraper.common import create_session
+    from mptracker.scraper.archive import PageArchive
+    stub_adapter.pages[URL] = ({'Content-Type': 'text/html'}, b'<p>1</p>')
+    stub_session(stub_adapter, archive=True).get(URL)
+
+    replay = create_session(replay=True)
+    assert replay.get(URL).content == b'<p>1</p>'
+    assert len(stub_adapter.requests) == 1
+    assert len(PageArchive(data_dir / 'archive')) == 1
+
+    with pytest.raises(requests.ConnectionError):
+        replay.get(URL + '1')
+
+
+def test_archive_stores_unchanged_content_once(data_dir, stub_adapter):
+    from mptracker.scraper.archive import PageArchive
+    stub_adapter.pages[URL] = ({}, b'<p>1</p>')
+    session = stub_session(stub_adapter, archive=True)
+    session.get(URL)
+    session.get(URL)
+    archive = PageArchive(data_dir / 'archive')
+    assert archive.db.execute('SELECT COUNT(*) FROM page').fetchone()[0] == 1
+    assert len(list((data_dir / 'archive' / 'objects').walkfiles())) == 1
+
+    stub_adapter.pages[URL] = ({}, b'<p>2</p>')
+    session.get(URL)
+    assert archive.load(URL)[2] == b'<p>2</p>'
+    assert archive.db.execute('SELECT COUNT(*) FROM page').fetchone()[0] == 2
+
+
+def test_revalidated_pages_are_archived(data_dir, stub_adapter):
+    from mptracker.scraper.archive import PageArchive
+    stub_adapter.pages[URL] = ({'ETag': '"a"'}, b'<p>1</p>')
+    stub_session(stub_adapter, cache_name='pages', revalidate=True).get(URL)
+
+    session = stub_session(stub_adapter, cache_name='pages', revalidate=True,
+                           archive=True)
+    response = session.get(URL)
+    assert response.status_code == 200
+    assert response.content == b'<p>1</p>'
+    assert stub_adapter.requests[-1].headers['If-None-Match'] == '"a"'
+    assert PageArchive(data_dir / 'archive').load(URL)[2] == b'<p>1</p>'
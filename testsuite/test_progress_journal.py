@@ -0,0 +1,48 @@
+from datetime import date
+
+
+def test_journal_is_reloaded_on_resume(models_app):
+    from mptracker import models
+    from mptracker.scraper import ProgressJournal
+    journal = ProgressJournal('votes')
+    journal.record('run', {'start': '2013-06-10', 'days': 3})
+    journal.record(date(2013, 6, 10), ['a', 'b'])
+    journal.record(7277)
+    models.db.session.commit()
+
+    resumed = ProgressJournal('votes', resume=True)
+    assert resumed.get('run') == {'start': '2013-06-10', 'days': 3}
+    assert date(2013, 6, 10) in resumed
+    assert resumed.get(date(2013, 6, 10)) == ['a', 'b']
+    assert 7277 in resumed
+    assert '7277' in resumed
+    assert resumed.get(7277) is None
+    assert date(2013, 6, 11) not in resumed
+    assert resumed.get(date(2013, 6, 11), []) == []
+
+
+def test_journal_is_discarded_without_resume(models_app):
+    from mptracker import models
+    from mptracker.scraper import ProgressJournal
+    ProgressJournal('votes').record(7277)
+    ProgressJournal('transcripts').record(7277)
+    models.db.session.commit()
+
+    assert 7277 not in ProgressJournal('votes')
+    models.db.session.commit()
+    assert 7277 not in ProgressJournal('votes', resume=True)
+    assert 7277 in ProgressJournal('transcripts', resume=True)
+
+
+def test_finished_journal_is_deleted(models_app):
+    from mptracker import models
+    from mptracker.scraper import ProgressJournal
+    journal = ProgressJournal('votes')
+    journal.record(7277)
+    models.db.session.commit()
+    journal.finish()
+    models.db.session.commit()
+
+    assert 7277 not in journal
+    assert 7277 not in ProgressJournal('votes', resume=True)
+    assert models.ScraperCheckpoint.query.count() == 0
@@ -87,6 +87,23 @@ def test_get_activity(session):
     assert '(pdf)' in activity[-1].html
 
 
+def test_get_activity_leaves_page_unchanged(session):
+    from mptracker.scraper.proposals import ProposalScraper
+    PROP_URL = 'http://www.cdep.ro/pls/proiecte/upl_pck.proiect?idp=13037'
+
+    session.url_map.update({
+        PROP_URL: PAGES_DIR / 'proposal-2-13037',
+    })
+
+    scraper = ProposalScraper(session)
+    page = scraper.fetch_url(PROP_URL)
+    html = page.outerHtml()
+    first = scraper.get_activity(page)
+    assert page.outerHtml() == html
+    second = scraper.get_activity(page)
+    assert [ac.html for ac in first] == [ac.html for ac in second]
+
+
 def test_merge_activity(session):
     from mptracker.scraper.proposals import ProposalScraper
     PROP_URL_CDEP = PROPOSAL_URL + 'idp=13037&cam=2'
@@ -108,6 +125,29 @@ def test_merge_activity(session):
     assert "trimis pentru aviz la Consiliul legislativ" in activity[4].html
 
 
+def test_proposal_survives_journal_round_trip(session):
+    from flask import json
+    from mptracker.scraper.proposals import ProposalScraper, Proposal
+
+    session.url_map.update({
+        LISTING_URL % (126, 2012): PAGES_DIR / 'proposal-listing-2012-126',
+        PROPOSAL_URL + 'idp=17135&cam=1': PAGES_DIR / 'proposal-1-17135',
+        PROPOSAL_URL + 'idp=13348&cam=2': PAGES_DIR / 'proposal-2-13348',
+        PROPOSAL_URL + 'idp=17422&cam=1': PAGES_DIR / 'proposal-1-17422',
+        PROPOSAL_URL + 'idp=17343&cam=1': PAGES_DIR / 'proposal-1-17343',
+    })
+
+    scraper = ProposalScraper(session)
+    [pr, _, _] = scraper.fetch_for_mp((2012, 126), {})
+    copy = Proposal.from_dict(json.loads(json.dumps(pr.as_dict())))
+    assert copy.cdeppks == pr.cdeppks
+    assert copy.date == pr.date
+    assert copy.title == pr.title
+    assert copy.pdf_url == pr.pdf_url
+    assert ([(ac.date, ac.location, ac.html) for ac in copy.activity] ==
+            [(ac.date, ac.location, ac.html) for ac in pr.activity])
+
+
 @pytest.mark.parametrize(['in_html', 'out_html'], [
     ('', ''),
     ('  ', ''),
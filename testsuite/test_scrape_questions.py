@@ -0,0 +1,97 @@
+from datetime import date
+from path import path
+
+INDEX_URL = ('http://www.cdep.ro/pls/parlam/'
+             'interpelari.lista?tip=&dat={year}&idl=1')
+
+DETAIL_URL = 'http://www.cdep.ro/pls/parlam/interpelari.detalii?idi=%d'
+
+PAGES_DIR = path(__file__).abspath().parent / 'pages'
+
+INDEX_HTML = """<html><body><div id="pageContent"><table>
+<tr><td>1</td><td><a href="%s">1234A</a></td><td>%s</td></tr>
+<tr><td>2</td><td><a href="%s">1235A</a></td>
+    <td>Ministerul Justiţiei</td></tr>
+</table></div></body></html>"""
+
+
+def index_page(tmpdir, name, status):
+    html = INDEX_HTML % (DETAIL_URL % 1, status, DETAIL_URL % 2)
+    page_path = path(str(tmpdir)) / name
+    page_path.write_bytes(html.encode('iso-8859-2'))
+    return page_path
+
+
+def test_skipped_questions_are_not_fetched(session, tmpdir):
+    from mptracker.scraper.questions import QuestionScraper
+
+    session.url_map[INDEX_URL.format(year=2013)] = \
+        index_page(tmpdir, '2013', "Ministerul Culturii")
+    session.url_map[INDEX_URL.format(year=2014)] = \
+        index_page(tmpdir, '2014', "Ministerul Culturii")
+    seen = []
+
+    def skip(href, digest):
+        seen.append((href, digest))
+        return True
+
+    scraper = QuestionScraper(session=session, skip=skip)
+    assert list(scraper.run(2013, 2014)) == []
+    assert [href for href, digest in seen] == [DETAIL_URL % 1,
+                                               DETAIL_URL % 2] * 2
+
+
+def test_index_digest_follows_row_changes(session, tmpdir):
+    from mptracker.scraper.questions import QuestionScraper
+
+    scraper = QuestionScraper(session=session)
+    digests = []
+    for status in ["Ministerul Culturii", "Ministerul Culturii",
+                   "Ministerul Culturii (răspuns)"]:
+        session.url_map = {INDEX_URL.format(year=2014):
+                           index_page(tmpdir, status, status)}
+        index = scraper.fetch_url(INDEX_URL.format(year=2014))
+        digests.append(dict(scraper.index_rows(index)))
+
+    assert digests[0] == digests[1]
+    assert digests[1][DETAIL_URL % 1] != digests[2][DETAIL_URL % 1]
+    assert digests[1][DETAIL_URL % 2] == digests[2][DETAIL_URL % 2]
+
+
+def test_answered_question(session):
+    from mptracker.scraper.questions import QuestionScraper
+    session.url_map[DETAIL_URL % 20001] = \
+        PAGES_DIR / 'interpelari.detalii-20001'
+    scraper = QuestionScraper(session=session)
+    question = scraper.get_question(DETAIL_URL % 20001)
+    assert question['number'] == '1234A/10-06-2013'
+    assert question['date'] == date(2013, 6, 10)
+    assert question['person'] == [("Ion Popescu", 2012, 168)]
+    assert question['pdf_url'].endswith('/interpelari/2013/r1234A.pdf')
+    assert question['answered']
+
+
+def test_question_waiting_for_an_answer(session):
+    from mptracker.scraper.questions import QuestionScraper
+    session.url_map[DETAIL_URL % 20002] = \
+        PAGES_DIR / 'interpelari.detalii-20002'
+    scraper = QuestionScraper(session=session)
+    question = scraper.get_question(DETAIL_URL % 20002)
+    assert question['addressee'] == ["Ministerul Sănătăţii"]
+    assert not question['answered']
+
+
+def test_known_questions_are_skipped_unless_they_may_have_changed():
+    from mptracker.scraper import is_question_current
+    pending_since = date(2014, 3, 1)
+    old = date(2014, 1, 10)
+    recent = date(2014, 3, 10)
+
+    assert not is_question_current(None, 'a', pending_since)
+    assert not is_question_current(('a', True, old), 'b', pending_since)
+    assert not is_question_current(('a', False, recent), 'b', pending_since)
+    assert not is_question_current(('a', False, recent), 'a', pending_since)
+    assert is_question_current(('a', True, recent), 'a', pending_since)
+    assert is_question_current(('a', False, old), 'a', pending_since)
+    assert not is_question_current(('a', False, pending_since), 'a',
+                                   pending_since)
@@ -5,9 +5,7 @@ from path import path
 PAGES_DIR = path(__file__).abspath().parent / 'pages'
 
 
-def test_2013_06_10(session):
-    from mptracker.scraper.transcripts import TranscriptScraper
-
+def map_session_7277(session):
     TRANSCRIPT_URL = 'http://www.cdep.ro/pls/steno/'
     session.url_map.update({
         TRANSCRIPT_URL + 'steno.sumar?ids=7277':
@@ -37,6 +35,12 @@ def test_2013_06_10(session):
         TRANSCRIPT_URL + 'steno.stenograma?ids=7277&idm=12&idl=1':
             PAGES_DIR / 'steno.stenograma-7277-12',
     })
+
+
+def test_2013_06_10(session):
+    from mptracker.scraper.transcripts import TranscriptScraper
+
+    map_session_7277(session)
     transcript_scraper = TranscriptScraper(session)
     transcript_session = transcript_scraper.fetch_session(7277)
 
@@ -63,3 +67,96 @@ def test_2013_06_10(session):
     assert paragraphs[0]['serial'] == '07277/01-001'
     paragraph_serial_values = [p['serial'] for p in paragraphs]
     assert sorted(set(paragraph_serial_values)) == paragraph_serial_values
+
+
+def test_parallel_sessions_are_yielded_in_order(session):
+    from mptracker.scraper.transcripts import TranscriptScraper
+
+    def paragraph_serials(transcript_session):
+        return [p['serial'] for chapter in transcript_session.chapters
+                            for p in chapter.paragraphs]
+
+    map_session_7277(session)
+    transcript_scraper = TranscriptScraper(session)
+    expected = paragraph_serials(transcript_scraper.fetch_session(7277))
+    results = list(transcript_scraper.fetch_sessions([7277] * 5, workers=3))
+
+    assert [cdeppk for cdeppk, transcript_session in results] == [7277] * 5
+    for cdeppk, transcript_session in results:
+        assert paragraph_serials(transcript_session) == expected
+
+
+def test_chapter_pages_are_not_kept_in_the_document_cache(session):
+    from mptracker.scraper.common import DocumentCache
+    from mptracker.scraper.transcripts import TranscriptScraper
+
+    map_session_7277(session)
+    session.documents = DocumentCache(2 ** 30)
+    transcript_scraper = TranscriptScraper(session)
+    transcript_session = transcript_scraper.fetch_session(7277, stream=True)
+    assert len(list(transcript_session.chapters)) == 12
+    assert [url for (url, cdep) in session.documents.documents] == [
+        'http://www.cdep.ro/pls/steno/steno.sumar?ids=7277',
+    ]
+
+
+def probe_scraper(published):
+    from mptracker.scraper.transcripts import TranscriptScraper
+
+    class ProbeScraper(TranscriptScraper):
+
+        def fetch_url(self, url):
+            cdeppk = int(url.rsplit('=', 1)[1])
+            self.probed.append(cdeppk)
+            return cdeppk
+
+        def get_session_date(self, cdeppk):
+            return date(2013, 6, 10) if cdeppk in published else None
+
+    scraper = ProbeScraper()
+    scraper.probed = []
+    return scraper
+
+
+def test_newest_session_is_found_with_few_requests():
+    scraper = probe_scraper(set(range(7000, 7301)))
+    assert scraper.find_newest_session(7000) == 7300
+    assert len(scraper.probed) < 40
+
+
+def test_newest_session_probe_skips_short_gaps():
+    scraper = probe_scraper({7000, 7003, 7004})
+    assert scraper.find_newest_session(7000) == 7004
+
+
+def test_newest_session_is_known_one():
+    scraper = probe_scraper({7000})
+    assert scraper.find_newest_session(7000) == 7000
+    assert scraper.probed == [7001, 7002, 7003]
+
+
+def test_missing_sessions_skip_ids_recently_found_empty(models_app):
+    from datetime import timedelta
+    from mptracker import models
+    from mptracker.scraper import (find_missing_sessions,
+                                   record_empty_session)
+
+    class NewestScraper:
+        def find_newest_session(self, known):
+            return 7006
+
+    for serial in ['07000/01', '07001/01', '07004/01']:
+        models.db.session.add(models.TranscriptChapter(serial=serial))
+    record_empty_session(7002, True)
+    record_empty_session(7003, True)
+    record_empty_session(7005, True)
+    models.db.session.commit()
+    record_empty_session(7005, False)
+    models.db.session.commit()
+
+    assert find_missing_sessions(NewestScraper(), 5) == [7005, 7006]
+
+    row = models.ScraperCheckpoint.query.filter_by(key='7003').one()
+    row.data = {'checked': (date.today() - timedelta(days=40)).isoformat()}
+    models.db.session.commit()
+    assert find_missing_sessions(NewestScraper(), 5) == [7003, 7005, 7006]
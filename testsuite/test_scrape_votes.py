@@ -0,0 +1,35 @@
+from datetime import date
+
+
+def test_calendar_follows_contiguous_sessions():
+    from mptracker.scraper.votes import SittingCalendar
+    calendar = SittingCalendar([
+        (7000, date(2013, 6, 10)),
+        (7001, date(2013, 6, 12)),
+        (7001, date(2013, 6, 13)),
+    ])
+    assert calendar.may_have_votes(date(2013, 6, 10))
+    assert not calendar.may_have_votes(date(2013, 6, 11))
+    assert calendar.may_have_votes(date(2013, 6, 12))
+
+
+def test_calendar_guesses_weekdays_in_gaps_between_sessions():
+    from mptracker.scraper.votes import SittingCalendar
+    calendar = SittingCalendar([
+        (7000, date(2013, 6, 10)),
+        (7002, date(2013, 6, 13)),
+    ])
+    assert calendar.may_have_votes(date(2013, 6, 11))
+    assert calendar.may_have_votes(date(2013, 6, 12))
+    assert not calendar.may_have_votes(date(2013, 6, 15))
+
+
+def test_calendar_guesses_weekdays_after_the_last_session():
+    from mptracker.scraper.votes import SittingCalendar
+    vacations = [(date(2013, 7, 1), date(2013, 9, 2))]
+    calendar = SittingCalendar([(7000, date(2013, 6, 10))], vacations)
+    assert calendar.may_have_votes(date(2013, 6, 14))
+    assert not calendar.may_have_votes(date(2013, 6, 15))
+    assert not calendar.may_have_votes(date(2013, 6, 16))
+    assert not calendar.may_have_votes(date(2013, 7, 1))
+    assert calendar.may_have_votes(date(2013, 9, 2))
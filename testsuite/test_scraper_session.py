@@ -0,0 +1,205 @@
+import requests
+
+
+def test_fetch_many_reads_ahead_at_most_twice_the_concurrency():
+    from mptracker.scraper.common import Scraper
+
+    class StubScraper(Scraper):
+        def fetch_url(self, url, cache=True):
+            return url.upper()
+
+    session = requests.Session()
+    session.concurrency = 2
+    requested = []
+
+    def urls():
+        for n in range(20):
+            requested.append(n)
+            yield 'page%d' % n
+
+    pages = StubScraper(session).fetch_many(urls())
+    assert next(pages) == 'PAGE0'
+    assert len(requested) == 4
+    assert list(pages) == ['PAGE%d' % n for n in range(1, 20)]
+
+
+def test_fetch_url_can_leave_pages_out_of_the_document_cache(session):
+    from path import path
+    from mptracker.scraper.common import (Scraper, DocumentCache,
+                                          PARSED_PAGE_SIZE_RATIO)
+    page_path = path(__file__).abspath().parent / 'pages' / 'steno.sumar-7277'
+    session.url_map.update({'http://a/shared': page_path,
+                            'http://a/once': page_path})
+    session.documents = DocumentCache(2 ** 30)
+    scraper = Scraper(session)
+
+    scraper.fetch_url('http://a/once', cache=False)
+    assert len(session.documents) == 0
+    scraper.fetch_url('http://a/shared')
+    assert len(session.documents) == 1
+    assert session.documents.size == page_path.size * PARSED_PAGE_SIZE_RATIO
+    assert scraper.fetch_url('http://a/shared') is not None
+    assert session.documents.hits == 1
+
+
+URL = 'http://www.cdep.ro/pls/steno/evot.nominal?idv=11000'
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_token_bucket_spaces_out_requests(monkeypatch):
+    from mptracker.scraper import common
+    clock = FakeClock()
+    monkeypatch.setattr(common, 'time', clock)
+    bucket = common.TokenBucket(rate=2, capacity=2)
+    assert [bucket.acquire() for n in range(4)] == [0, 0, .5, .5]
+    clock.now += 10
+    assert bucket.acquire() == 0
+    assert clock.sleeps == [.5, .5]
+
+
+def test_host_throttle_keeps_a_bucket_per_host(monkeypatch):
+    from mptracker.scraper import common
+    monkeypatch.setattr(common, 'time', FakeClock())
+    throttle = common.HostThrottle(rate=1)
+    assert throttle.acquire('http://www.cdep.ro/a') == 0
+    assert throttle.acquire('http://www.senat.ro/a') == 0
+    assert throttle.acquire('http://www.cdep.ro/b') == 1
+    assert sorted(throttle.buckets) == ['www.cdep.ro', 'www.senat.ro']
+
+
+def test_document_cache_evicts_least_recently_used():
+    from mptracker.scraper.common import DocumentCache
+    cache = DocumentCache(max_bytes=10)
+    cache.put('a', 'A', 4)
+    cache.put('b', 'B', 4)
+    assert cache.get('a') == 'A'
+    cache.put('c', 'C', 4)
+    assert cache.get('b') is None
+    assert cache.get('a') == 'A'
+    assert cache.get('c') == 'C'
+    assert (len(cache), cache.size) == (2, 8)
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_validator_store_keeps_only_pages_with_validators(tmpdir):
+    from mptracker.scraper.common import ValidatorStore
+    store = ValidatorStore(str(tmpdir / 'validators'))
+    response = requests.Response()
+    response.headers = {'ETag': '"a"', 'Content-Type': 'text/html'}
+    response._content = b'<p>1</p>'
+    store.save(URL, response)
+    response.headers = {}
+    store.save(URL + '1', response)
+
+    assert store.get(URL) == {
+        'etag': '"a"',
+        'last_modified': None,
+        'headers': {'ETag': '"a"', 'Content-Type': 'text/html'},
+        'content': b'<p>1</p>',
+    }
+    assert store.get(URL + '1') is None
+
+
+def test_revalidating_session_serves_stored_copy_on_304(tmpdir,
+                                                        stub_adapter):
+    from mptracker.scraper.common import RevalidatingSession
+    session = RevalidatingSession(str(tmpdir / 'validators'))
+    session.mount('http://', stub_adapter)
+    stub_adapter.pages[URL] = (
+        {'ETag': '"a"', 'Content-Type': 'text/html; charset=utf-8'},
+        b'<p>1</p>',
+    )
+    statuses = []
+    session.hooks['response'].append(
+        lambda response, **extra: statuses.append(response.status_code))
+
+    first = session.get(URL)
+    assert not getattr(first, 'from_cache', False)
+    assert 'If-None-Match' not in stub_adapter.requests[-1].headers
+
+    second = session.get(URL)
+    assert stub_adapter.requests[-1].headers['If-None-Match'] == '"a"'
+    assert statuses == [200, 304]
+    assert second.status_code == 200
+    assert second.from_cache
+    assert second.text == '<p>1</p>'
+    assert second.encoding == 'utf-8'
+
+
+def test_http_metrics_per_endpoint():
+    from datetime import timedelta
+    from mptracker.scraper.common import HttpMetrics
+
+    def response(url, status_code=200, content=b'', seconds=0,
+                 throttle_wait=0, from_cache=False):
+        rv = requests.Response()
+        rv.url = url
+        rv.status_code = status_code
+        rv._content = content
+        rv.elapsed = timedelta(seconds=seconds)
+        rv.throttle_wait = throttle_wait
+        rv.from_cache = from_cache
+        return rv
+
+    metrics = HttpMetrics()
+    metrics.record_response(response(URL, content=b'1234', seconds=1.5,
+                                     throttle_wait=1.2))
+    metrics.record_response(response(URL, status_code=304, seconds=.2))
+    metrics.record_response(response(URL, content=b'12', from_cache=True))
+    metrics.record_response(response('http://www.cdep.ro/pls/steno/'
+                                     'evot.data?dat=20130610', seconds=3))
+
+    data = metrics.as_json()
+    nominal = data['endpoints']['evot.nominal']
+    assert nominal['requests'] == 3
+    assert nominal['cache_hits'] == 2
+    assert nominal['bytes'] == 6
+    assert abs(nominal['download_time'] - .5) < 1e-9
+    assert abs(nominal['throttle_wait'] - 1.2) < 1e-9
+    assert nominal['latency_histogram'][:4] == [1, 0, 1, 1]
+    assert abs(nominal['cache_hit_ratio'] - 2 / 3) < 1e-9
+
+    total = data['total']
+    assert total['requests'] == 4
+    assert total['cache_hits'] == 2
+    assert sum(total['latency_histogram']) == 4
+    assert data['endpoints']['evot.data']['latency_histogram'][6] == 1
+
+
+def test_recorded_metrics_are_saved_when_the_command_fails(tmpdir,
+                                                           monkeypatch):
+    import json
+    from path import path
+    from mptracker import scraper
+
+    monkeypatch.setattr(scraper, 'PROJECT_ROOT', path(str(tmpdir)))
+    metrics_dir = tmpdir.join('_data', 'metrics')
+
+    with scraper.recorded_metrics('votes'):
+        pass
+    try:
+        with scraper.recorded_metrics('questions'):
+            raise KeyError('boom')
+    except KeyError:
+        pass
+    else:
+        assert False, "the exception should propagate"
+
+    saved = {}
+    for saved_file in metrics_dir.listdir():
+        data = json.loads(saved_file.read_text('utf-8'))
+        saved[data['command']] = data['failed']
+    assert saved == {'votes': False, 'questions': True}